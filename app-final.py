@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
-import os, sys, json, glob, time
-import logging, base64, requests, asyncio
+import os, sys, json, glob, time, signal
+import logging, base64, requests
 from typing import Dict, Any
 import threading
 import tempfile
@@ -13,6 +13,10 @@ timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 from flask import Flask, request, jsonify, send_from_directory
 from twilio.twiml.messaging_response import MessagingResponse
 from dotenv import load_dotenv
+from job_pipeline import JobPipeline, PipelineFull
+from dedupe_cache import DedupeCache
+from event_loop import llm_loop
+from response_cache import ResponseCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,10 +24,10 @@ logger = logging.getLogger(__name__)
 sys.path.insert(0, r'C:\Users\hp\Desktop\Whatsapp-bot')
 sys.stdout.reconfigure(encoding="utf-8")
 
-try:
-    from puterai import main
-except ImportError:
-    main = None
+from puterai import build_messages, client_pool
+from llm_router import build_router
+from coalescer import MessageCoalescer
+from context_budget import trim_history
 
 load_dotenv()
 
@@ -32,6 +36,15 @@ app = Flask(__name__)
 # ========== CONFIGURATION ==========
 IMAGE_DIR = "puter_images"
 audio_files = "audio_files"
+LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", 60))  # secondes
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") == "1"
+FIRST_MESSAGE_MIN_CHARS = 40  # évite d'envoyer un premier message d'un seul mot
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")  # gtts (gTTS/pyttsx3) ou coqui (voix clonées)
+# Historique envoyé au LLM: nombre d'échanges et budget en tokens
+HISTORY_MAX_EXCHANGES = int(os.getenv("HISTORY_MAX_EXCHANGES", 3))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))
+CONTEXT_MESSAGE_TOKENS = int(os.getenv("CONTEXT_MESSAGE_TOKENS", 200))
+HELP_COMMANDS = ("help", "aide", "/help")  # commandes d'aide (jamais regroupées)
 os.makedirs(IMAGE_DIR, exist_ok=True)
 
 # ========== SERVICE D'UPLOAD POUR WHATSAPP ==========
@@ -151,6 +164,40 @@ def send_whatsapp_audio(to_number: str, audio_url: str, caption: str = "") -> bo
         logger.error(f"❌ Erreur envoi WhatsApp: {e}")
         return False
 
+WHATSAPP_BODY_LIMIT = 1600  # Limite Twilio par message
+
+def send_whatsapp_text(to_number: str, text: str) -> bool:
+    """Envoie un message texte sur WhatsApp via l'API REST Twilio"""
+    try:
+        from twilio.rest import Client
+
+        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+        whatsapp_number = os.getenv("TWILIO_WHATSAPP_NUMBER", "+14155238886")
+
+        if not all([account_sid, auth_token]):
+            logger.error("❌ Configuration Twilio manquante dans .env")
+            return False
+
+        client = Client(account_sid, auth_token)
+        to = to_number if to_number.startswith('+') else f"+{to_number}"
+
+        # Découper les longues réponses (limite Twilio)
+        text = text or "🤖"
+        chunks = [text[i:i + WHATSAPP_BODY_LIMIT] for i in range(0, len(text), WHATSAPP_BODY_LIMIT)]
+        for chunk in chunks:
+            message = client.messages.create(
+                from_=f"whatsapp:{whatsapp_number}",
+                to=f"whatsapp:{to}",
+                body=chunk
+            )
+            logger.info(f"✅ Texte envoyé à {to}! SID: {message.sid}")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Erreur envoi texte WhatsApp: {e}")
+        return False
+
 # ========== GÉNÉRATEUR PUTER CORRIGÉ ==========
 class PuterGenerator:
     """Génère des images avec Puter.js et les envoie automatiquement"""
@@ -411,6 +458,13 @@ class PuterGenerator:
 # ========== INITIALISATION ==========
 image_gen = PuterGenerator()
 uploader = ImageUploader()
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX", 1000)),
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", 3600)),
+    context_aware=os.getenv("RESPONSE_CACHE_CONTEXT", "1") == "1",
+)
+# Puter, OpenAI, Hugging Face (selon .env) routés par latence
+router = build_router()
 
 # ========== ROUTES API CORRIGÉES ==========
 @app.route('/api/process-puter-image', methods=['POST'])
@@ -657,8 +711,17 @@ def serve_audio(filename):
 
 
 # ========== LOGIQUE WHATSAPP ==========
-def generate_reply(message: str, sender_number: str = "") -> Dict[str, Any]:
-    """Génère la réponse pour WhatsApp"""
+def generate_reply(message: str, sender_number: str = "", history=None,
+                   on_partial=None) -> Dict[str, Any]:
+    """Génère la réponse pour WhatsApp
+
+    history: derniers échanges role/content (SimpleMemory.get_history), réduits
+    au budget CONTEXT_TOKEN_BUDGET avant l'appel LLM.
+
+    Avec on_partial, la réponse LLM est lue en streaming: le début de la réponse
+    (première phrase) est passé à on_partial dès qu'il est complet, et
+    reply["streamed"] contient ce préfixe déjà envoyé.
+    """
     
     msg = message.strip()
     
@@ -695,107 +758,251 @@ def generate_reply(message: str, sender_number: str = "") -> Dict[str, Any]:
             logger.error(f"❌ Erreur: {e}")
             return {"text": f"❌ Erreur: {str(e)[:80]}"}
     
-    elif msg.lower() in ["help", "aide", "/help"]:
-        return {"text": "🤖 Commandes Puter.ai:\n• /image [texte] - Génère une image\n• help - Aide"}
+    elif msg.lower() == "/voix" or msg.lower().startswith("/voix "):
+        # Voix des réponses audio Coqui (TTS_VOICES), mémorisée par utilisateur
+        if TTS_ENGINE != "coqui":
+            return {"text": "⚠️ Le choix de la voix nécessite le moteur Coqui (TTS_ENGINE=coqui)."}
+        name = msg[5:].strip()
+        voices = voice.speaker_cache.voices
+        if not name:
+            current = voice.speaker_cache.resolve(voice.user_voices.get(sender_number))
+            return {"text": f"🎙️ Voix disponibles: {', '.join(voices)}\nVoix actuelle: {current}"}
+        if name not in voices:
+            return {"text": f"⚠️ Voix inconnue. Disponibles: {', '.join(voices)}"}
+        voice.user_voices.set(sender_number, name)
+        return {"text": f"✅ Voix {name} sélectionnée"}
+    
+    elif msg.lower() in HELP_COMMANDS:
+        voix = "• /voix [nom] - Choisit la voix\n" if TTS_ENGINE == "coqui" else ""
+        return {"text": f"🤖 Commandes Puter.ai:\n• /image [texte] - Génère une image\n{voix}• help - Aide"}
     
     else:
-        if main:
+        if router.providers:
+            # Prompts répétés ("Salut"...): réponse en cache, pas d'appel LLM
+            history = trim_history(history or [], CONTEXT_TOKEN_BUDGET, CONTEXT_MESSAGE_TOKENS)
+            cache_key = response_cache.key(msg, history)
+            cached = response_cache.get(cache_key)
+            if cached:
+                return {"text": cached, "cached": True}
+            
+            messages = build_messages(msg, history)
             try:
-                reply = asyncio.run(main(msg))
+                if on_partial and STREAM_REPLIES:
+                    return stream_reply(messages, cache_key, on_partial)
+                reply = llm_loop.run(router.complete(messages), timeout=LLM_TIMEOUT)
+                response_cache.put(cache_key, reply)
                 return {"text": reply}
             except:
                 return {"text": "🤖 Je suis votre assistant."}
         return {"text": "🤖 Utilisez /image pour générer."}
 
+def stream_reply(messages, cache_key, on_partial) -> Dict[str, Any]:
+    """Lit la réponse LLM en streaming et envoie le début dès qu'il est prêt"""
+    text = ""
+    streamed = ""
+    for sentence in llm_loop.iterate(router.stream(messages), timeout=LLM_TIMEOUT):
+        text += sentence
+        if not streamed and len(text.strip()) >= FIRST_MESSAGE_MIN_CHARS:
+            streamed = text
+            on_partial(streamed.strip())
+    
+    response_cache.put(cache_key, text)
+    return {"text": text, "streamed": streamed}
+
+def process_whatsapp_job(job: Dict[str, Any], pipeline: JobPipeline):
+    """Traite un message WhatsApp en arrière-plan: STT -> LLM -> texte -> TTS -> audio"""
+    from simple_memory import memory
+    sender = job["sender"]
+    incoming_msg = job["text"]
+    media_url = job.get("media_url")
+
+    # 1. Transcrire l'audio SI présent
+    if media_url:
+        print(f"🎤 Audio reçu: {media_url}")
+        transcribed_text = pipeline.stage("stt").run(transcribe_audio_from_url, media_url, sender)
+
+        if not transcribed_text:
+            reply = {"text": "❌ Je n'ai pas pu transcrire votre audio."}
+            send_whatsapp_text(sender, reply["text"])
+            return reply
+
+        print(f"📝 Transcription: {transcribed_text}")
+        incoming_msg = transcribed_text
+
+    # 2. Générer la réponse avec contexte
+    # Avec MEMORY_RETRIEVAL=1: les échanges passés les plus pertinents pour ce message
+    history = memory.get_history(sender, max_messages=HISTORY_MAX_EXCHANGES, query=incoming_msg)
+    # La première phrase part sur WhatsApp pendant que le LLM continue
+    first_sentence = lambda text: send_whatsapp_text(sender, text)
+    reply = pipeline.stage("llm").run(generate_reply, incoming_msg, sender, history, first_sentence)
+
+    # 3. Envoyer le texte (ou la suite du texte) dès qu'il est prêt
+    streamed = reply.get("streamed", "")
+    remaining = reply["text"][len(streamed):].strip()
+    if remaining or not streamed:
+        send_whatsapp_text(sender, remaining)
+    memory.save_message(sender, incoming_msg, reply['text'])
+
+    # Les messages vocaux reçoivent seulement une réponse texte
+    if media_url:
+        return reply
+
+    # 4. Création de l'audio
+    import datetime
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    if TTS_ENGINE == "coqui":
+        return send_coqui_voice(sender, reply, timestamp)
+    filename = f"audio_{sender}_{timestamp}.mp3"
+    audio_path = f"audio_files/{filename}"
+    os.makedirs("audio_files", exist_ok=True)
+
+    try:
+        # Texte déjà prononcé (salutations, aide, réponses en cache): pas de passage par l'étage TTS
+        generated = voice.fetch_cached_voice(reply['text'], audio_path)
+        if not generated:
+            generated = pipeline.stage("tts").run(voice.text_to_voices, reply['text'], audio_path, check_cache=False)
+        #voice.tts_to_voice(reply['text'], audio_path)
+    except Exception as e:
+        print(f"❌ Erreur génération audio: {e}")
+        return reply
+
+    if generated:
+        print(f"✅ Audio généré: {filename}")
+        send_audio_file_to(sender, filename)
+    return reply
+
+def send_coqui_voice(sender, reply, timestamp):
+    """Réponse audio Coqui avec la voix choisie par l'utilisateur (/voix)
+
+    Écrite en mp3: WhatsApp refuse les pièces jointes WAV.
+    """
+    filename = f"audio_{sender}_{timestamp}.mp3"
+    audio_path = f"audio_files/{filename}"
+    os.makedirs("audio_files", exist_ok=True)
+    try:
+        pipeline.stage("tts").run(voice.tts_to_voice, reply['text'], audio_path, voice.user_voices.get(sender))
+    except Exception as e:
+        print(f"❌ Erreur génération audio Coqui: {e}")
+        return reply
+    print(f"✅ Audio généré: {filename}")
+    send_audio_file_to(sender, filename)
+    return reply
+
+pipeline = JobPipeline(
+    process_whatsapp_job,
+    stages={
+        "stt": {"workers": int(os.getenv("STT_WORKERS", 2)), "max_queue": int(os.getenv("STT_QUEUE", 50))},
+        "llm": {"workers": int(os.getenv("LLM_WORKERS", 4)), "max_queue": int(os.getenv("LLM_QUEUE", 100))},
+        "tts": {"workers": int(os.getenv("TTS_WORKERS", 2)), "max_queue": int(os.getenv("TTS_QUEUE", 100))},
+    },
+    dispatchers=int(os.getenv("JOB_WORKERS", 8)),
+    max_jobs=int(os.getenv("JOB_QUEUE", 200)),
+)
+
+# Retries Twilio: un MessageSid déjà vu n'est jamais retraité
+dedupe = DedupeCache(
+    max_entries=int(os.getenv("DEDUPE_MAX", 10000)),
+    ttl=int(os.getenv("DEDUPE_TTL", 3600)),
+    db_path=os.getenv("DEDUPE_DB") or None,
+)
+
+def _finish_dedupe(message_sids, future):
+    """Enregistre le résultat d'un job pour les retries des mêmes MessageSid"""
+    for message_sid in message_sids:
+        if future.exception() is not None:
+            dedupe.fail(message_sid)
+        else:
+            dedupe.complete(message_sid, future.result())
+
+def submit_job(job: Dict[str, Any]) -> bool:
+    """Met un job dans le pipeline, False si le pipeline est saturé"""
+    message_sids = job.get("message_sids", [])
+    try:
+        future = pipeline.submit(job)
+    except PipelineFull as e:
+        logger.warning(f"⚠️ {e}")
+        for message_sid in message_sids:
+            dedupe.fail(message_sid)
+        return False
+    if message_sids:
+        future.add_done_callback(lambda f: _finish_dedupe(message_sids, f))
+    return True
+
+BUSY_MESSAGE = "⏳ Beaucoup de demandes en ce moment, réessayez dans un instant."
+
+def is_command(text: str) -> bool:
+    """Commande (/image, /voix, help...): toujours traitée seule, jamais regroupée"""
+    text = text.strip().lower()
+    return text.startswith("/") or text in HELP_COMMANDS
+
+def flush_coalesced(sender: str, messages):
+    """Un seul prompt (et une seule réponse) pour une rafale de messages"""
+    text = "\n".join(m["text"] for m in messages)
+    sids = [m["sid"] for m in messages if m["sid"]]
+    if len(messages) > 1:
+        logger.info(f"🧩 {len(messages)} messages de {sender} regroupés")
+    if not submit_job({"sender": sender, "text": text, "media_url": "", "message_sids": sids}):
+        send_whatsapp_text(sender, BUSY_MESSAGE)
+
+coalescer = MessageCoalescer(
+    flush_coalesced,
+    window_ms=int(os.getenv("COALESCE_WINDOW_MS", 1500)),  # 0 = désactivé
+    max_wait_ms=int(os.getenv("COALESCE_MAX_WAIT_MS", 5000)),
+)
+
 @app.route("/whatsapp", methods=["POST"])
 def whatsapp_webhook():
-    """Webhook WhatsApp"""
-    from simple_memory import memory
+    """Webhook WhatsApp: accuse réception tout de suite, le pipeline répond via l'API REST"""
     incoming_msg = request.values.get("Body", "").strip()
     sender = request.values.get("From", "").replace('whatsapp:', '')
     media_url = request.values.get("MediaUrl0", "")  # URL de l'audio
-    
-    # Récupérer le contexte
-    context = memory.get_context(sender, max_messages=3)
-    
+    message_sid = request.values.get("MessageSid", "")
+
     logger.info(f"📩 {sender}: {incoming_msg}")
-    
+
     resp = MessagingResponse()
-    msg = resp.message()
-    
-    # 1. Gérer l'audio SI présent
-    if media_url:
-        print(f"🎤 Audio reçu: {media_url}")
-        
-        # Transcrire l'audio
-        transcribed_text = transcribe_audio_from_url(media_url, sender)
-        
-        if transcribed_text:
-            print(f"📝 Transcription: {transcribed_text}")
-            
-            # === CORRECTION ICI : Utiliser enhanced_message pour l'audio aussi ===
-            if context:
-                enhanced_message = f"[Contexte: {context}] {transcribed_text}"
-            else:
-                enhanced_message = transcribed_text
-            
-            # Générer la réponse avec contexte
-            reply = generate_reply(enhanced_message, sender)
-            msg.body(reply["text"])
-            
-            # === SAUVEGARDER LA MÉMOIRE pour l'audio ===
-            memory.save_message(sender, transcribed_text, reply['text'])
-            
-        else:
-            msg.body("❌ Je n'ai pas pu transcrire votre audio.")
-            return str(resp)
-        
+
+    # Si pas d'audio ET pas de texte
+    if not media_url and not incoming_msg:
+        resp.message("Bonjour ! Envoyez-moi un message texte ou audio.")
         return str(resp)
-    
-    # 2. Si pas d'audio MAIS avec texte
-    if incoming_msg:
-        # === CORRECTION ICI : Construire enhanced_message ===
-        if context:
-            enhanced_message = f"[Contexte: {context}] {incoming_msg}"
-        else:
-            enhanced_message = incoming_msg
-        
-        # Générer la réponse
-        reply = generate_reply(enhanced_message, sender)
-        
-        # Création de l'audio
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"audio_{sender}_{timestamp}.mp3"
-        audio_path = f"audio_files/{filename}"
-        
-        os.makedirs("audio_files", exist_ok=True)
-        
-        try:
-            import voice
-            voice.text_to_voices(reply['text'], audio_path)
-            #voice.tts_to_voice(reply['text'], audio_path)
-            print(f"✅ Audio généré: {filename}")
-            
-            # Envoyer le texte d'abord
-            msg.body(reply["text"])
-            
-            # Envoyer l'audio en arrière-plan
-            time.sleep(2)
-            send_audio_async(sender, filename)
-            
-        except Exception as e:
-            print(f"❌ Erreur génération audio: {e}")
-            msg.body(reply["text"])
-        
-        # === SAUVEGARDER LA MÉMOIRE ===
-        memory.save_message(sender, incoming_msg, reply['text'])
-        
+
+    # Retry Twilio: la réponse est déjà envoyée (ou en cours) via l'API REST
+    if message_sid:
+        duplicate = dedupe.begin(message_sid)
+        if duplicate:
+            logger.info(f"🔁 Doublon ignoré ({duplicate['status']}): {message_sid}")
+            return str(resp)
+
+    # Texte: attendre quelques instants les messages suivants du même sender
+    if not media_url and not is_command(incoming_msg):
+        coalescer.add(sender, {"text": incoming_msg, "sid": message_sid})
         return str(resp)
-    
-    # 3. Si pas d'audio ET pas de texte
-    msg.body("Bonjour ! Envoyez-moi un message texte ou audio.")
+
+    # Audio ou commande: les textes en attente passent d'abord pour garder l'ordre
+    coalescer.flush_sender(sender)
+    job = {"sender": sender, "text": incoming_msg, "media_url": media_url,
+           "message_sids": [message_sid] if message_sid else []}
+    if not submit_job(job):
+        resp.message(BUSY_MESSAGE)
+
+    # Réponse vide = simple accusé de réception pour Twilio
     return str(resp)
+
+@app.route("/api/pipeline-stats")
+def api_pipeline_stats():
+    """Profondeur des files et latences par étage"""
+    stats = pipeline.stats()
+    stats["dedupe"] = dedupe.stats()
+    stats["response_cache"] = response_cache.stats()
+    stats["llm_router"] = router.to_dict()
+    stats["coalescer"] = coalescer.stats()
+    stats["audio_cache"] = voice.audio_cache.stats()
+    stats["coqui"] = voice.coqui_pool.stats()
+    from simple_memory import memory
+    if hasattr(memory, "stats"):
+        stats["memory"] = memory.stats()
+    return jsonify(stats)
 # def whatsapp_webhook():
 #     """Webhook WhatsApp"""
 #     from simple_memory import memory
@@ -1050,6 +1257,45 @@ def transcribe_audio_from_url(audio_url, sender_id):
                 print(f"⚠️ Erreur nettoyage {file_path}: {clean_error}")
 
 
+def send_audio_file_to(sender, filename):
+    """Envoie un audio de audio_files/ au sender via l'API REST Twilio"""
+    ngrok_url = "https://unsaluting-elucidative-gene.ngrok-free.dev"
+    audio_path = f"audio_files/{filename}"
+    
+    if not os.path.exists(audio_path):
+        print(f"⚠️ Audio introuvable: {audio_path}")
+        return False
+    
+    # Extraire le numéro du sender
+    phone_number = f"whatsapp:+{sender}" if not sender.startswith('+') else f"whatsapp:{sender}"
+    
+    # Envoyer l'audio
+    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+    
+    if not (account_sid and auth_token):
+        print("❌ Variables Twilio manquantes")
+        return False
+    
+    client = Client(account_sid, auth_token)
+    audio_url = f"{ngrok_url}/audio_files/{filename}"
+    
+    try:
+        message = client.messages.create(
+            media_url=[audio_url],
+            from_='whatsapp:+14155238886',
+            to=phone_number
+        )
+        print(f"✅ Audio envoyé à {phone_number}: {message.sid}")
+        
+        # Archiver
+        #archive_file(filename)
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur envoi audio: {e}")
+        return False
+
 def send_audio_async(sender, filename):
     """Envoie l'audio en arrière-plan"""
     import threading
@@ -1058,37 +1304,7 @@ def send_audio_async(sender, filename):
     def send_audio_thread():
         # Attendre un peu pour que le texte soit envoyé d'abord
         time.sleep(2)
-        
-        ngrok_url = "https://unsaluting-elucidative-gene.ngrok-free.dev"
-        audio_path = f"audio_files/{filename}"
-        
-        if os.path.exists(audio_path):
-            # Extraire le numéro du sender
-            phone_number = f"whatsapp:+{sender}" if not sender.startswith('+') else f"whatsapp:{sender}"
-            
-            # Envoyer l'audio
-            account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-            auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-            
-            if account_sid and auth_token:
-                client = Client(account_sid, auth_token)
-                audio_url = f"{ngrok_url}/audio_files/{filename}"
-                
-                try:
-                    message = client.messages.create(
-                        media_url=[audio_url],
-                        from_='whatsapp:+14155238886',
-                        to=phone_number
-                    )
-                    print(f"✅ Audio envoyé à {phone_number}: {message.sid}")
-                    
-                    # Archiver
-                    #archive_file(filename)
-                    
-                except Exception as e:
-                    print(f"❌ Erreur envoi audio: {e}")
-            else:
-                print("❌ Variables Twilio manquantes")
+        send_audio_file_to(sender, filename)
     
     # Démarrer le thread
     thread = threading.Thread(target=send_audio_thread)
@@ -1254,6 +1470,52 @@ if __name__ == "__main__":
     logger.info(f"📁 Dossier images: {IMAGE_DIR}")
     logger.info("📤 Upload automatique vers catbox.moe activé")
     
+    # Boucle asyncio partagée pour les appels LLM
+    llm_loop.start()
+    
+    # Connexion Puter une seule fois au démarrage
+    if any(p.name == "puter" for p in router.providers):
+        try:
+            client_pool.start()
+        except Exception as e:
+            logger.warning(f"⚠️ Connexion Puter différée au premier message: {e}")
+    
+    # Modèles Coqui chargés en arrière-plan (le premier audio n'attend pas le chargement)
+    if os.getenv("COQUI_PRELOAD", "0") == "1":
+        threading.Thread(target=voice.coqui_pool.start, name="coqui-preload", daemon=True).start()
+    
+    # Résumé glissant des longues conversations par le LLM
+    if os.getenv("MEMORY_SUMMARIZER") == "llm":
+        from simple_memory import memory
+        from summarizer import LLMSummarizer
+        if hasattr(memory, "set_summarizer"):
+            memory.set_summarizer(LLMSummarizer(
+                lambda messages: llm_loop.run(router.complete(messages), timeout=LLM_TIMEOUT),
+                max_chars=int(os.getenv("MEMORY_SUMMARY_CHARS", 600)),
+            ))
+            logger.info("📝 Résumé des conversations par le LLM activé")
+    
+    # SIGTERM (systemd, docker stop) n'exécute pas les handlers atexit:
+    # messages regroupés traités puis mémoire vidée sur disque avant de quitter
+    def shutdown(signum, frame):
+        from simple_memory import memory
+        logger.info("🛑 Arrêt demandé: traitement des messages en attente")
+        coalescer.flush_all()
+        waiter = threading.Thread(target=pipeline.shutdown, name="pipeline-shutdown", daemon=True)
+        waiter.start()
+        timeout = float(os.getenv("SHUTDOWN_TIMEOUT", 8))
+        waiter.join(timeout)
+        if waiter.is_alive():
+            # Déjà sauvegardé au cas où le process serait tué (SIGKILL) pendant l'attente;
+            # la mémoire n'est fermée qu'après les derniers save_message
+            logger.warning(f"⏳ Jobs encore en cours après {timeout:.0f}s, mémoire sauvegardée en attendant")
+            if hasattr(memory, "flush"):
+                memory.flush()
+            waiter.join()
+        memory.close()
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, shutdown)
+    
     # Désactiver debug=True pour éviter les problèmes de threading sur Windows
     # Utiliser threaded=True pour supporter les requêtes concurrentes
     app.run(host="0.0.0.0", port=port, debug=False, threaded=True)
\ No newline at end of file
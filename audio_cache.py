@@ -0,0 +1,155 @@
+# audio_cache.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_tts_text(text: str) -> str:
+    """Texte tel qu'il sera prononcé: Unicode NFC, espaces normalisés"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def link_or_copy(src, dst):
+    """Hard link si possible (même disque), sinon copie"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def discard_output(path):
+    """Supprime un fichier de sortie avant de le régénérer
+
+    S'il s'agit d'un hard link vers le cache, le réécrire sur place
+    modifierait l'audio en cache.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class AudioCache:
+    """Cache disque des audios TTS, adressé par contenu
+
+    Clé = sha256(texte normalisé, moteur, voix, langue, paramètres de
+    post-traitement). Taille bornée (max_bytes) avec éviction LRU; un hit
+    est lié (hard link) ou copié vers le fichier demandé, qui ne doit donc
+    jamais être réécrit sur place (voir discard_output).
+    """
+
+    def __init__(self, cache_dir="audio_cache", max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # nom de fichier -> taille, du moins au plus récemment utilisé
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Reprend le contenu du dossier, dans l'ordre du dernier accès"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._bytes += size
+
+    @staticmethod
+    def key(text, engine, voice=None, language=None, params=None, ext="mp3"):
+        payload = json.dumps(
+            [normalize_tts_text(text), engine, voice, language, params or {}],
+            ensure_ascii=False, sort_keys=True,
+        )
+        return f"{hashlib.sha256(payload.encode('utf-8')).hexdigest()}.{ext}"
+
+    def fetch(self, key, dest_path):
+        """Copie l'audio en cache vers dest_path; False si absent"""
+        return self.fetch_first([key], dest_path)
+
+    def fetch_first(self, keys, dest_path):
+        """Premier audio en cache parmi plusieurs clés candidates (ex: gTTS puis pyttsx3)
+
+        Une seule recherche: au plus un hit ou un miss dans les statistiques.
+        """
+        with self._lock:
+            key = next((k for k in keys if k in self._entries), None)
+            if key is None:
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = os.path.join(self.cache_dir, key)
+        try:
+            link_or_copy(path, dest_path)
+            os.utime(path)  # ordre LRU conservé au redémarrage
+        except FileNotFoundError:
+            # Supprimé à la main ou évincé entre-temps
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+            return False
+        print(f"♻️ Audio réutilisé depuis le cache: {dest_path}")
+        return True
+
+    def store(self, key, src_path):
+        """Ajoute un audio généré au cache puis évince les plus anciens"""
+        path = os.path.join(self.cache_dir, key)
+        tmp_path = None
+        try:
+            # Fichier temporaire unique: deux workers peuvent stocker la même clé en même temps
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            os.close(fd)
+            # Copie: src_path pourra être réécrit sans toucher au cache
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"⚠️ Audio non mis en cache: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                name, old_size = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                evicted.append(name)
+        for name in evicted:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+# Instance globale
+audio_cache = AudioCache(
+    os.getenv("AUDIO_CACHE_DIR", "audio_cache"),
+    int(os.getenv("AUDIO_CACHE_MAX_MB", 200)) * 1024 * 1024,
+)
@@ -0,0 +1,99 @@
+# audio_post.py
+import io
+import os
+from math import gcd
+
+import numpy as np
+import scipy.signal
+import soundfile as sf
+
+
+class PostProcessor:
+    """Post-traitement des voix TTS en mémoire, en une seule passe de filtrage
+
+    Même rendu que l'ancienne chaîne fichier -> librosa.load -> passe-bande
+    -> reverb -> passe-bas -> fichier _post, mais:
+    - passe-bande et passe-bas fusionnés en une seule cascade SOS précalculée
+    - reverb (IR à deux coefficients) appliquée comme un retard-addition
+    - un seul fichier écrit
+    Les filtres étant linéaires, la reverb peut suivre la cascade sans
+    changer le résultat.
+    """
+
+    def __init__(self, sr=22050, band=(300, 3000), lowpass=8000, order=4,
+                 direct=0.6, reverb=0.2, delay_ms=10):
+        self.sr = sr
+        self.band = tuple(band)
+        self.lowpass = lowpass
+        self.order = order
+        self.direct = direct
+        self.reverb = reverb
+        self.delay_ms = delay_ms
+        self.delay = int(delay_ms / 1000 * sr)
+        self.sos = np.vstack([
+            scipy.signal.butter(order, list(band), btype='band', fs=sr, output='sos'),
+            scipy.signal.butter(order, lowpass, btype='low', fs=sr, output='sos'),
+        ])
+
+    @property
+    def params(self):
+        """Paramètres du rendu (clé du cache audio): tous ceux du constructeur"""
+        return {"sr": self.sr, "band": list(self.band), "lowpass": self.lowpass, "order": self.order,
+                "direct": self.direct, "reverb": self.reverb, "delay_ms": self.delay_ms}
+
+    def process(self, wav, sr):
+        """Échantillons du modèle -> signal post-traité à self.sr"""
+        y = np.asarray(wav, dtype=np.float32)
+        if y.ndim > 1:
+            y = y.mean(axis=-1)
+        if sr != self.sr:
+            factor = gcd(int(sr), int(self.sr))
+            y = scipy.signal.resample_poly(y, self.sr // factor, sr // factor).astype(np.float32)
+
+        y = scipy.signal.sosfilt(self.sos, y).astype(np.float32)
+
+        # Reverb légère: y[n] = direct*y[n] + reverb*y[n - delay]
+        out = self.direct * y
+        if 0 < self.delay < len(y):
+            out[self.delay:] += self.reverb * y[:-self.delay]
+        return out
+
+    def write(self, path, wav, sr):
+        """Post-traite et écrit le fichier en une fois (WAV, ou MP3 selon l'extension)
+
+        WhatsApp n'accepte pas le WAV: les réponses vocales sont en .mp3,
+        encodé par libsndfile (>= 1.1) ou à défaut par pydub/ffmpeg.
+        """
+        y = self.process(wav, sr)
+        if os.path.splitext(path)[1].lower() != ".mp3":
+            sf.write(path, y, self.sr, format="WAV")
+        elif "MP3" in sf.available_formats():
+            sf.write(path, y, self.sr, format="MP3")
+        else:
+            from pydub import AudioSegment
+            buffer = io.BytesIO()
+            sf.write(buffer, y, self.sr, format="WAV", subtype="PCM_16")
+            buffer.seek(0)
+            AudioSegment.from_wav(buffer).export(path, format="mp3")
+
+
+def crossfade_concat(segments, sr, fade_ms=30):
+    """Met bout à bout des segments audio, avec un fondu enchaîné linéaire"""
+    segments = [np.asarray(segment, dtype=np.float32) for segment in segments]
+    if not segments:
+        return np.zeros(0, np.float32)
+    fade = int(fade_ms / 1000 * sr)
+    total = sum(len(segment) for segment in segments)
+    out = np.empty(total, np.float32)
+    end = 0
+    for segment in segments:
+        overlap = min(fade, end, len(segment))
+        if overlap:
+            ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+            out[end - overlap:end] = out[end - overlap:end] * (1 - ramp) + segment[:overlap] * ramp
+        out[end:end + len(segment) - overlap] = segment[overlap:]
+        end += len(segment) - overlap
+    return out[:end]
+
+
+post_processor = PostProcessor()
@@ -0,0 +1,86 @@
+# benchmarks/audio_post.py
+"""Post-traitement des voix TTS: ancienne chaîne fichier vs PostProcessor en mémoire
+
+Usage: python benchmarks/audio_post.py [--seconds 30 120 300] [--model-sr 16000]
+
+L'ancienne chaîne reproduit tts_to_voice avant optimisation: écriture du
+wav du modèle, librosa.load à 22050 Hz, passe-bande, np.convolve avec l'IR
+de 30 ms, passe-bas, écriture du fichier _post. Le signal est un bruit
+modulé de la durée d'une longue réponse.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import scipy.signal
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_post import PostProcessor  # noqa: E402
+
+try:
+    import librosa
+except ImportError:
+    librosa = None
+
+
+def legacy(wav, model_sr, path):
+    sf.write(path, wav, model_sr, format="WAV")
+    if librosa is not None:
+        y, sr = librosa.load(path, sr=22050)
+    else:
+        # Sans librosa: lecture + rééchantillonnage scipy (ordre de grandeur comparable)
+        y, sr = sf.read(path, dtype="float32")
+        y = scipy.signal.resample_poly(y, 22050, model_sr)
+        sr = 22050
+    sos = scipy.signal.butter(4, [300, 3000], btype='band', fs=sr, output='sos')
+    y = scipy.signal.sosfilt(sos, y)
+    ir = np.zeros(int(0.03 * sr))
+    ir[0] = 0.6
+    ir[int(0.01 * sr)] = 0.2
+    y = np.convolve(y, ir)[:len(y)]
+    sos = scipy.signal.butter(4, 8000, btype='low', fs=sr, output='sos')
+    y = scipy.signal.sosfilt(sos, y)
+    sf.write(f"{path}_post", y, sr, format="WAV")
+    return y
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30, 120, 300])
+    parser.add_argument("--model-sr", type=int, default=16000, help="fréquence de sortie du modèle (YourTTS: 16000)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="audio_post_")
+    processor = PostProcessor()
+    rng = np.random.default_rng(0)
+    # Échauffement (import/JIT de librosa) hors mesure
+    warmup = rng.standard_normal(args.model_sr).astype(np.float32)
+    legacy(warmup, args.model_sr, os.path.join(tmp, "warmup.wav"))
+    processor.process(warmup, args.model_sr)
+    for seconds in args.seconds:
+        n = int(seconds * args.model_sr)
+        envelope = 0.5 + 0.5 * np.sin(np.linspace(0, seconds * 2 * np.pi * 3, n))
+        wav = (rng.standard_normal(n) * 0.1 * envelope).astype(np.float32)
+
+        start = time.perf_counter()
+        old = legacy(wav, args.model_sr, os.path.join(tmp, "legacy.wav"))
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        processor.write(os.path.join(tmp, "new.wav"), wav, args.model_sr)
+        new_time = time.perf_counter() - start
+
+        new = processor.process(wav, args.model_sr)
+        size = min(len(old), len(new))
+        error = np.max(np.abs(old[:size] - new[:size])) / (np.max(np.abs(old)) or 1)
+        print(f"⏱️ {seconds:5.0f}s d'audio: ancien {old_time * 1000:7.1f} ms, "
+              f"nouveau {new_time * 1000:7.1f} ms (x{old_time / new_time:.1f}), écart max {error:.1%}")
+
+
+if __name__ == "__main__":
+    main()
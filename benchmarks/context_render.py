@@ -0,0 +1,53 @@
+# benchmarks/context_render.py
+"""Micro-benchmark de SimpleMemory.get_history (chemin du webhook): rendu mémorisé vs recalculé
+
+Usage: python benchmarks/context_render.py [--calls 200000] [--max-messages 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simple_memory import SimpleMemory, render_history  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--max-messages", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="context_render_")
+    memory = SimpleMemory(os.path.join(tmp, "chat_memory.json"), backend="json", write_behind=True)
+    real_stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    for i in range(10):
+        memory.save_message("+33600000000", f"Question {i} " * 10, f"Réponse détaillée {i} " * 30)
+    sys.stdout = real_stdout
+
+    user_id, count = "+33600000000", args.max_messages
+
+    def recompute():
+        # Ancien chemin: deux prises de verrou + reconstruction de la liste à chaque appel
+        return render_history(memory._last_messages(user_id, count), memory.get_summary(user_id))
+
+    def memoized():
+        return memory.get_history(user_id, max_messages=count)
+
+    assert recompute() == memoized()
+    results = {}
+    for name, fn in (("recalculé", recompute), ("mémorisé", memoized)):
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        results[name] = elapsed
+        print(f"⏱️ {name:10s} {elapsed / args.calls * 1e6:6.2f} µs/appel")
+    print(f"✅ Accélération: x{results['recalculé'] / results['mémorisé']:.1f}")
+    memory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/memory_footprint.py
+"""Empreinte RAM de la mémoire conversationnelle: dicts vs buffers circulaires
+
+Usage: python benchmarks/memory_footprint.py [--users 100000] [--exchanges 10]
+
+Compare l'ancienne représentation (dict de 3 chaînes avec horodatage ISO
+dans une liste) aux UserHistory/Exchange à __slots__. Les textes des
+messages sont partagés entre utilisateurs pour ne mesurer que la structure.
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_buffer import Exchange, UserHistory, intern_user_id  # noqa: E402
+
+TEXTS = [f"message numéro {i} avec un peu de texte" for i in range(100)]
+
+
+def build_dicts(users, exchanges, now):
+    memory = {}
+    for u in range(users):
+        user_id = f"+3360000{u:05d}"
+        created = datetime.fromtimestamp(now - u).isoformat()
+        memory[user_id] = {'created': created, 'messages': []}
+        for i in range(exchanges):
+            stamp = datetime.fromtimestamp(now - u + i).isoformat()
+            memory[user_id]['messages'].append({'user': TEXTS[i % 100], 'bot': TEXTS[(i + 1) % 100], 'time': stamp})
+            memory[user_id]['updated'] = stamp
+    return memory
+
+
+def build_buffers(users, exchanges, now):
+    memory = {}
+    for u in range(users):
+        user_id = intern_user_id(f"+3360000{u:05d}")
+        history = memory[user_id] = UserHistory(exchanges, now - u)
+        for i in range(exchanges):
+            history.append(Exchange(TEXTS[i % 100], TEXTS[(i + 1) % 100], now - u + i))
+    return memory
+
+
+def measure(build, users, exchanges):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    memory = build(users, exchanges, int(time.time()))
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del memory
+    return size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--exchanges", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"👥 {args.users} utilisateurs × {args.exchanges} échanges")
+    results = {}
+    for name, build in (("dict", build_dicts), ("ring buffer", build_buffers)):
+        size, elapsed = measure(build, args.users, args.exchanges)
+        results[name] = size
+        print(f"📦 {name:12s} {size / 1024 / 1024:8.1f} Mo  "
+              f"({size / args.users:6.0f} o/utilisateur, construit en {elapsed:.2f}s)")
+    print(f"✅ Gain: {1 - results['ring buffer'] / results['dict']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/snapshot_load.py
+"""Démarrage de SimpleMemory: snapshot JSON vs snapshot binaire (marshal)
+
+Usage: python benchmarks/snapshot_load.py [--users 20000] [--exchanges 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_store import read_binary_snapshot, read_json, write_binary_snapshot, write_json_atomic  # noqa: E402
+from simple_memory import SimpleMemory  # noqa: E402
+
+
+def build(users, exchanges):
+    now = time.time()
+    data = {}
+    for u in range(users):
+        messages = [
+            {'user': f"Question {i} de l'utilisateur {u}", 'bot': f"Réponse {i} un peu plus longue " * 4,
+             'time': datetime.fromtimestamp(now - u + i).isoformat(timespec='seconds')}
+            for i in range(exchanges)
+        ]
+        data[f"+3360000{u:05d}"] = {'created': messages[0]['time'], 'messages': messages, 'updated': messages[-1]['time']}
+    return data
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--exchanges", type=int, default=10)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="snapshot_load_")
+    data = build(args.users, args.exchanges)
+    json_path = os.path.join(tmp, "chat_memory.json")
+    snap_path = os.path.join(tmp, "chat_memory.snap")
+    write_json_atomic(json_path, data)
+    # Même mémoire, au format compact du snapshot binaire
+    compact = SimpleMemory(json_path, backend="json")._snapshot(compact=True)
+    write_binary_snapshot(snap_path, compact)
+
+    print(f"👥 {args.users} utilisateurs × {args.exchanges} échanges")
+    for name, path, reader, fmt, expected in (("json", json_path, read_json, "json", data),
+                                              ("binaire", snap_path, read_binary_snapshot, "binary", compact)):
+        loaded, parse_time = timed(lambda: reader(path))
+        assert loaded == expected
+        memory, startup_time = timed(lambda: SimpleMemory(json_path, backend="json", snapshot_format=fmt))
+        assert len(memory.memory) == args.users
+        print(f"📦 {name:8s} {os.path.getsize(path) / 1024 / 1024:6.1f} Mo  "
+              f"lecture {parse_time * 1000:7.1f} ms  démarrage SimpleMemory {startup_time * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# benchmarks/stress_memory.py
+"""Stress test de SimpleMemory: écritures et lectures concurrentes
+
+Usage: python benchmarks/stress_memory.py [--backend json|journal] [--threads 16] [--write-behind] [--max-users 4]
+
+Vérifie qu'aucun échange n'est perdu ni dupliqué, qu'aucune exception
+n'est levée, et que le fichier rechargé correspond à la mémoire en RAM.
+Le buffer de chaque utilisateur est assez grand pour garder toutes ses
+écritures: chaque échange t<thread>-m<i> doit être présent, dans l'ordre
+de son thread. Code de sortie 1 en cas d'échec.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simple_memory import SimpleMemory  # noqa: E402
+
+
+def user_state(memory, user_id):
+    """UserHistory d'un utilisateur, résident ou en stockage froid"""
+    with memory._user_lock(user_id):
+        return memory._get_user(user_id)
+
+
+def expected_keys(args, u):
+    """Échanges écrits pour user<u>, dans l'ordre de chaque thread"""
+    return [f"t{t}-m{i}" for t in range(args.threads) for i in range(args.messages) if i % args.users == u]
+
+
+def check_user(errors, args, u, messages, label=""):
+    """Tous les échanges écrits présents, sans doublon, dans l'ordre de leur thread"""
+    keys = [m.user for m in messages]
+    expected = expected_keys(args, u)
+    missing = set(expected) - set(keys)
+    if missing or len(keys) != len(expected):
+        errors.append(f"user{u}{label}: {len(keys)} messages (attendu {len(expected)}), "
+                      f"{len(missing)} perdus (ex: {sorted(missing)[:3]})")
+        return
+    for t in range(args.threads):
+        own = [int(k.split("-m")[1]) for k in keys if k.startswith(f"t{t}-")]
+        if own != sorted(own):
+            errors.append(f"user{u}{label}: échanges du thread {t} dans le désordre")
+
+
+def run(args, tmp):
+    path = os.path.join(tmp, "chat_memory.json")
+    options = {"compact_every": 500} if args.backend == "journal" else {}
+    options["write_behind"] = args.write_behind
+    options["max_users"] = args.max_users
+    # Buffer assez grand pour qu'aucun échange ne sorte: une perte est visible
+    options["max_exchanges"] = max(len(expected_keys(args, u)) for u in range(args.users))
+    memory = SimpleMemory(path, backend=args.backend, **options)
+
+    errors = []
+    done = threading.Event()
+    reads = [0]
+
+    def writer(t):
+        try:
+            for i in range(args.messages):
+                memory.save_message(f"user{i % args.users}", f"t{t}-m{i}", f"r{t}-{i}")
+        except Exception as e:
+            errors.append(f"writer {t}: {e!r}")
+
+    def reader():
+        try:
+            while not done.is_set():
+                for u in range(args.users):
+                    memory.get_context(f"user{u}")
+                    memory.get_history(f"user{u}", max_messages=10)
+                    reads[0] += 1
+        except Exception as e:
+            errors.append(f"reader: {e!r}")
+
+    # Les prints de save_message noieraient la sortie
+    real_stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    start = time.perf_counter()
+    readers = [threading.Thread(target=reader) for _ in range(args.readers)]
+    writers = [threading.Thread(target=writer, args=(t,)) for t in range(args.threads)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    memory.close()
+    total = args.threads * args.messages
+
+    # Chaque utilisateur doit garder tous ses échanges, sans doublon
+    for u in range(args.users):
+        user = user_state(memory, f"user{u}")
+        check_user(errors, args, u, user.messages() if user else [])
+
+    # Journal: une ligne par échange, aucun numéro de séquence perdu
+    if args.backend == "journal":
+        seqs = [user_state(memory, f"user{u}").seq for u in range(args.users)]
+        if max(seqs, default=0) != total:
+            errors.append(f"séquence finale {max(seqs, default=0)} (attendu {total})")
+
+    # Le rechargement depuis le disque doit redonner la même mémoire
+    reloaded = SimpleMemory(path, backend=args.backend, **options)
+    for u in range(args.users):
+        user = user_state(reloaded, f"user{u}")
+        check_user(errors, args, u, user.messages() if user else [], " (rechargé)")
+        # Le résumé (best effort, en arrière-plan) n'est pas comparé
+        if user and user.to_dict()["messages"] != user_state(memory, f"user{u}").to_dict()["messages"]:
+            errors.append(f"user{u}: contenu rechargé différent")
+    reloaded.close()
+    sys.stdout = real_stdout
+
+    print(f"⏱️ {total} écritures et {reads[0]} lectures en {elapsed:.2f}s ({args.backend})")
+    if args.max_users:
+        print(f"🧊 {memory.evictions} évictions, {memory.reloads} rechargements")
+    if errors:
+        for error in errors:
+            print(f"❌ {error}")
+        sys.exit(1)
+    print("✅ Aucun échange perdu")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="journal", choices=["json", "journal"])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--messages", type=int, default=200, help="échanges par thread")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--write-behind", action="store_true", help="écriture différée par lots")
+    parser.add_argument("--max-users", type=int, default=0, help="tiering: utilisateurs résidents max")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="stress_memory_")
+    try:
+        run(args, tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
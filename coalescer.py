@@ -0,0 +1,121 @@
+# coalescer.py
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MessageCoalescer:
+    """Regroupe les messages rapprochés d'un même sender en un seul prompt
+
+    Un message arrivé moins de `window_ms` après le précédent rejoint le même
+    lot. Le lot part quand le sender se tait pendant `window_ms`, au plus tard
+    `max_wait_ms` après le premier message, ou dès `max_messages` messages.
+    Le verrou du sender (un parmi un nombre fixe) est tenu du retrait du lot
+    jusqu'à sa soumission: flush_sender attend un lot en cours d'envoi, un
+    audio ne peut donc pas passer devant les textes qui le précèdent.
+    """
+
+    def __init__(self, flush, window_ms=1500, max_wait_ms=5000, max_messages=10):
+        # flush(sender, messages) reçoit la liste des messages du lot
+        self.flush = flush
+        self.window = window_ms / 1000
+        self.max_wait = max_wait_ms / 1000
+        self.max_messages = max_messages
+        self._buffers = {}  # sender -> {"messages", "first", "deadline"}
+        self._cond = threading.Condition()
+        self._sender_locks = [threading.Lock() for _ in range(64)]
+        self._thread = None
+        self.batches = 0
+        self.merged = 0
+
+    def add(self, sender, message):
+        """Ajoute un message au lot du sender"""
+        if self.window <= 0:
+            with self._sender_lock(sender):
+                self._emit(sender, [message])
+            return
+
+        now = time.monotonic()
+        ready = False
+        with self._cond:
+            buffer = self._buffers.get(sender)
+            if buffer is None:
+                buffer = self._buffers[sender] = {"messages": [], "first": now}
+            buffer["messages"].append(message)
+            buffer["deadline"] = min(now + self.window, buffer["first"] + self.max_wait)
+
+            if len(buffer["messages"]) >= self.max_messages:
+                ready = True
+            else:
+                self._ensure_thread()
+                self._cond.notify()
+
+        if ready:
+            self._emit_pending(sender)
+
+    def flush_sender(self, sender):
+        """Envoie tout de suite le lot en attente d'un sender (ex: avant un audio)
+
+        Au retour, tout texte reçu avant a été soumis (lot en cours compris).
+        """
+        self._emit_pending(sender)
+
+    def flush_all(self):
+        with self._cond:
+            senders = list(self._buffers)
+        for sender in senders:
+            self._emit_pending(sender)
+
+    def stats(self) -> dict:
+        with self._cond:
+            waiting = sum(len(b["messages"]) for b in self._buffers.values())
+            return {"pending_senders": len(self._buffers), "pending_messages": waiting,
+                    "batches": self.batches, "merged_messages": self.merged}
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="coalescer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        # Un seul thread surveille toutes les échéances
+        while True:
+            with self._cond:
+                while not self._buffers:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [s for s, b in self._buffers.items() if b["deadline"] <= now]
+                if not due:
+                    next_deadline = min(b["deadline"] for b in self._buffers.values())
+                    self._cond.wait(next_deadline - now)
+                    continue
+
+            for sender in due:
+                self._emit_pending(sender, due_before=now)
+
+    def _sender_lock(self, sender):
+        return self._sender_locks[hash(sender) % len(self._sender_locks)]
+
+    def _emit_pending(self, sender, due_before=None):
+        """Retire et soumet le lot du sender sous son verrou
+
+        due_before: seulement si son échéance est passée (un nouveau message
+        a pu la repousser entre-temps).
+        """
+        with self._sender_lock(sender):
+            with self._cond:
+                buffer = self._buffers.get(sender)
+                if buffer is None or (due_before is not None and buffer["deadline"] > due_before):
+                    return
+                del self._buffers[sender]
+            self._emit(sender, buffer["messages"])
+
+    def _emit(self, sender, messages):
+        self.batches += 1
+        self.merged += len(messages) - 1
+        try:
+            self.flush(sender, messages)
+        except Exception as e:
+            logger.error(f"❌ Erreur envoi du lot de {sender}: {e}")
@@ -0,0 +1,74 @@
+# cold_storage.py
+import json
+import sqlite3
+import threading
+import zlib
+
+from conversation_buffer import UserHistory
+
+
+class ColdStore:
+    """Stockage froid des utilisateurs inactifs: JSON compressé (zlib) dans SQLite
+
+    Une ligne par utilisateur; seq et updated restent lisibles sans
+    décompresser, pour savoir au démarrage quelle copie est la plus récente.
+    """
+
+    def __init__(self, db_path="chat_memory.cold.db", level=6):
+        self.db_path = db_path
+        self.level = level
+        self._local = threading.local()  # une connexion par thread
+        db = self._db()
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS cold_users (
+                user_id TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                updated INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def save(self, user_id, user):
+        """Écrit (ou remplace) un utilisateur; retourne la taille compressée"""
+        data = zlib.compress(json.dumps(user.to_dict(), ensure_ascii=False).encode("utf-8"), self.level)
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO cold_users (user_id, seq, updated, data) VALUES (?, ?, ?, ?)",
+                (user_id, user.seq, user.updated, data),
+            )
+        return len(data)
+
+    def load(self, user_id, capacity=10):
+        """UserHistory de l'utilisateur, ou None s'il n'est pas en stockage froid"""
+        row = self._db().execute("SELECT data FROM cold_users WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        return UserHistory.from_dict(json.loads(zlib.decompress(row[0])), capacity)
+
+    def versions(self):
+        """{user_id: (seq, updated)} de tous les utilisateurs froids"""
+        rows = self._db().execute("SELECT user_id, seq, updated FROM cold_users").fetchall()
+        return {user_id: (seq, updated) for user_id, seq, updated in rows}
+
+    def stats(self) -> dict:
+        count, size = self._db().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM cold_users"
+        ).fetchone()
+        return {"users": count, "bytes": size}
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
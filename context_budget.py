@@ -0,0 +1,71 @@
+# context_budget.py
+import re
+
+EMOJI_PATTERN = re.compile(
+    "["
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map
+    "\U0001F700-\U0001FAFF"
+    "\U00002702-\U000027B0"
+    "\U0000FE0F"
+    "]+",
+    flags=re.UNICODE
+)
+_SPACES = re.compile(r"[ \t]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation rapide du nombre de tokens (~4 caractères par token)"""
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
+
+
+def _clean(text: str) -> str:
+    return _SPACES.sub(" ", EMOJI_PATTERN.sub("", text)).strip()
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Coupe un message trop long en gardant son début"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max_tokens * 4]
+    # Couper proprement à la dernière fin de phrase ou espace
+    for sep in (". ", "\n", " "):
+        index = cut.rfind(sep)
+        if index > len(cut) // 2:
+            cut = cut[:index + 1]
+            break
+    return cut.rstrip() + " […]"
+
+
+def trim_history(history, budget_tokens=600, max_message_tokens=200):
+    """Réduit un historique role/content à un budget de tokens
+
+    Les emojis sont retirés, chaque message est tronqué à max_message_tokens
+    et les échanges les plus anciens sont abandonnés jusqu'à tenir dans le budget.
+    Les messages system de tête (résumé de la conversation) sont conservés
+    et comptent dans le budget.
+    """
+    head = []
+    while len(head) < len(history) and history[len(head)]["role"] == "system":
+        head.append(history[len(head)])
+    head = [
+        {"role": "system", "content": _truncate(_clean(m["content"]), max_message_tokens)}
+        for m in head
+    ]
+
+    trimmed = []
+    for message in history[len(head):]:
+        content = _truncate(_clean(message["content"]), max_message_tokens)
+        if content:
+            trimmed.append({"role": message["role"], "content": content})
+
+    total = sum(estimate_tokens(m["content"]) for m in head + trimmed)
+    while trimmed and total > budget_tokens:
+        total -= estimate_tokens(trimmed.pop(0)["content"])
+    # Toujours commencer par un message utilisateur
+    while trimmed and trimmed[0]["role"] != "user":
+        trimmed.pop(0)
+    return head + trimmed
@@ -0,0 +1,126 @@
+# conversation_buffer.py
+import sys
+from datetime import datetime
+
+
+def to_epoch(iso_time):
+    """Horodatage ISO -> secondes epoch (0 si absent ou illisible)"""
+    try:
+        return int(datetime.fromisoformat(iso_time).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def to_iso(epoch):
+    return datetime.fromtimestamp(epoch).isoformat() if epoch else ""
+
+
+class Exchange:
+    """Un échange utilisateur/bot, horodaté en secondes epoch"""
+
+    __slots__ = ("user", "bot", "time")
+
+    def __init__(self, user, bot, time):
+        self.user = user
+        self.bot = bot
+        self.time = time
+
+    def to_dict(self):
+        return {'user': self.user, 'bot': self.bot, 'time': to_iso(self.time)}
+
+
+class UserHistory:
+    """Derniers échanges d'un utilisateur dans un buffer circulaire
+
+    Les `capacity` slots sont réutilisés: un nouvel échange écrase le plus
+    ancien au lieu de recopier la liste à chaque sauvegarde. `rendered`
+    mémorise le contexte texte (et l'historique role/content) par
+    max_messages jusqu'au prochain échange;
+    `summary` résume les échanges sortis du buffer.
+    """
+
+    __slots__ = ("created", "updated", "seq", "capacity", "rendered", "summary", "_items", "_start")
+
+    def __init__(self, capacity=10, created=0):
+        self.created = created
+        self.updated = created
+        self.seq = 0
+        self.capacity = capacity
+        self.rendered = None  # max_messages (ou ("history", n)) -> rendu
+        self.summary = None
+        self._items = []
+        self._start = 0  # index du plus ancien échange une fois le buffer plein
+
+    def append(self, exchange):
+        """Ajoute un échange; retourne celui qu'il écrase (ou None)"""
+        items = self._items
+        evicted = None
+        if len(items) < self.capacity:
+            items.append(exchange)
+        else:
+            evicted = items[self._start]
+            items[self._start] = exchange
+            self._start = (self._start + 1) % self.capacity
+        self.updated = exchange.time
+        self.rendered = None
+        return evicted
+
+    def __len__(self):
+        return len(self._items)
+
+    def messages(self):
+        """Échanges du plus ancien au plus récent"""
+        if not self._start:
+            return list(self._items)
+        return self._items[self._start:] + self._items[:self._start]
+
+    def last(self, count):
+        # Même sémantique que messages[-count:]
+        return self.messages()[-count:]
+
+    def nbytes(self):
+        """Estimation de l'empreinte RAM (textes + objets)"""
+        return 200 + len(self.summary or "") + sum(100 + len(e.user) + len(e.bot) for e in self._items)
+
+    def to_dict(self):
+        """Format JSON historique de chat_memory.json"""
+        data = {
+            'created': to_iso(self.created),
+            'messages': [exchange.to_dict() for exchange in self.messages()],
+            'updated': to_iso(self.updated),
+        }
+        if self.seq:
+            data['seq'] = self.seq
+        if self.summary:
+            data['summary'] = self.summary
+        return data
+
+    def to_record(self):
+        """Forme compacte pour le snapshot binaire (horodatages epoch)"""
+        return (self.created, self.updated, self.seq, self.summary,
+                [(e.user, e.bot, e.time) for e in self.messages()])
+
+    @classmethod
+    def from_record(cls, record, capacity=10):
+        created, updated, seq, summary, messages = record
+        history = cls(capacity, created)
+        history._items = [Exchange(user, bot, time) for user, bot, time in messages[-capacity:]]
+        history.updated = updated
+        history.seq = seq
+        history.summary = summary
+        return history
+
+    @classmethod
+    def from_dict(cls, data, capacity=10):
+        history = cls(capacity, to_epoch(data.get('created')))
+        for msg in data.get('messages', [])[-capacity:]:
+            history.append(Exchange(msg.get('user', ''), msg.get('bot', ''), to_epoch(msg.get('time'))))
+        history.updated = to_epoch(data.get('updated')) or history.updated
+        history.seq = data.get('seq', 0)
+        history.summary = data.get('summary') or None
+        return history
+
+
+def intern_user_id(user_id):
+    """Un seul objet str par numéro d'expéditeur"""
+    return sys.intern(user_id)
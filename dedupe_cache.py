@@ -0,0 +1,114 @@
+# dedupe_cache.py
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+
+class DedupeCache:
+    """Cache borné avec TTL des MessageSid déjà traités (retries Twilio)"""
+
+    def __init__(self, max_entries=10000, ttl=3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # sid -> {"status", "result", "time"}
+        self._lock = threading.Lock()
+        self._db = None
+        self._ops = 0
+        if db_path:
+            # Stockage persistant optionnel (survit aux redémarrages, partagé entre process)
+            self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS dedupe ("
+                "sid TEXT PRIMARY KEY, status TEXT, result TEXT, created REAL)"
+            )
+            self._db.commit()
+
+    def begin(self, sid):
+        """Réserve un sid. Retourne None si nouveau, sinon l'entrée existante (doublon)"""
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get(sid)
+            if entry is not None:
+                return dict(entry)
+
+            if self._db is not None:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO dedupe (sid, status, result, created) VALUES (?, ?, NULL, ?)",
+                    (sid, IN_PROGRESS, now),
+                )
+                self._db.commit()
+                if cursor.rowcount == 0:
+                    # Déjà réservé par un autre process ou avant un redémarrage
+                    entry = self._load(sid)
+                    if entry is not None:
+                        self._remember(sid, entry)
+                        return dict(entry)
+                    # Ligne expirée: on la reprend
+                    self._db.execute(
+                        "UPDATE dedupe SET status = ?, result = NULL, created = ? WHERE sid = ?",
+                        (IN_PROGRESS, now, sid),
+                    )
+                    self._db.commit()
+
+            self._remember(sid, {"status": IN_PROGRESS, "result": None, "time": now})
+            return None
+
+    def complete(self, sid, result=None):
+        """Marque un sid comme traité et garde son résultat"""
+        with self._lock:
+            previous = self._entries.get(sid)
+            created = previous["time"] if previous else time.time()
+            # Même position: les entrées restent triées par date de réception
+            self._entries[sid] = {"status": DONE, "result": result, "time": created}
+            if self._db is not None:
+                self._db.execute(
+                    "UPDATE dedupe SET status = ?, result = ? WHERE sid = ?",
+                    (DONE, json.dumps(result, ensure_ascii=False), sid),
+                )
+                self._db.commit()
+
+    def fail(self, sid):
+        """Oublie un sid pour qu'un retry puisse relancer le traitement"""
+        with self._lock:
+            self._entries.pop(sid, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM dedupe WHERE sid = ?", (sid,))
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_progress = sum(1 for e in self._entries.values() if e["status"] == IN_PROGRESS)
+            return {"entries": len(self._entries), "in_progress": in_progress}
+
+    def _remember(self, sid, entry):
+        self._entries[sid] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, sid):
+        row = self._db.execute(
+            "SELECT status, result, created FROM dedupe WHERE sid = ?", (sid,)
+        ).fetchone()
+        if row is None or time.time() - row[2] > self.ttl:
+            return None
+        result = json.loads(row[1]) if row[1] else None
+        return {"status": row[0], "result": result, "time": row[2]}
+
+    def _purge(self, now):
+        # Les entrées les plus anciennes sont en tête
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if now - entry["time"] <= self.ttl:
+                break
+            self._entries.popitem(last=False)
+
+        self._ops += 1
+        if self._db is not None and self._ops % 500 == 0:
+            self._db.execute("DELETE FROM dedupe WHERE created < ?", (now - self.ttl,))
+            self._db.commit()
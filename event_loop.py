@@ -0,0 +1,98 @@
+# event_loop.py
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+class BackgroundLoop:
+    """Une seule boucle asyncio, dans un thread dédié, pour tous les appels LLM"""
+
+    def __init__(self, name="llm-loop", blocking_workers=8):
+        self.name = name
+        self.blocking_workers = blocking_workers
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        self.start()
+        return self._loop
+
+    def start(self):
+        """Démarre la boucle (une seule fois)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name=self.name, daemon=True)
+            self._thread.start()
+        ready.wait()
+
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        # Pool pour les appels bloquants (clients HTTP synchrones)
+        self._loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=self.blocking_workers, thread_name_prefix=f"{self.name}-io")
+        )
+        ready.set()
+        self._loop.run_forever()
+
+    def submit(self, coro):
+        """Planifie une coroutine, retourne un concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Exécute une coroutine depuis un thread synchrone et attend le résultat
+
+        Après timeout, la coroutine est annulée: elle ne garde pas de session
+        Puter ni de connexion en tournant encore sur la boucle.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise
+
+    def iterate(self, agen, timeout=None):
+        """Parcourt un générateur asynchrone depuis un thread synchrone"""
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except Exception as e:
+                items.put(e)
+            finally:
+                items.put(done)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item = items.get(timeout=timeout)
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Timeout ou lecture abandonnée: le flux s'arrête aussi sur la boucle
+            future.cancel()
+
+    def stop(self):
+        with self._lock:
+            if self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# Boucle partagée par l'application
+llm_loop = BackgroundLoop(blocking_workers=int(os.getenv("LLM_IO_WORKERS", 16)))
@@ -0,0 +1,230 @@
+# job_pipeline.py
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineFull(Exception):
+    """Levée quand un étage a atteint sa capacité maximale"""
+
+
+class StagePool:
+    """Pool de workers borné pour un étage du pipeline (LLM, STT, TTS...)"""
+
+    def __init__(self, name, workers=2, max_queue=50, window=200):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        # Nombre max de tâches acceptées (en cours + en attente)
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._done = 0
+        self._failed = 0
+        self._rejected = 0
+        self._latencies = deque(maxlen=window)
+
+    def submit(self, fn, *args, **kwargs):
+        """Soumet une tâche, lève PipelineFull si la file est pleine"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PipelineFull(f"Étage '{self.name}' saturé")
+
+        with self._lock:
+            self._queued += 1
+        try:
+            return self._executor.submit(self._run, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+
+    def run(self, fn, *args, **kwargs):
+        """Exécute une tâche sur l'étage et attend son résultat"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def _run(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        start = time.perf_counter()
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._running -= 1
+                self._latencies.append(elapsed)
+                if failed:
+                    self._failed += 1
+                else:
+                    self._done += 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Profondeur de file et latences de l'étage"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "done": self._done,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+        stats["p50_ms"] = _percentile_ms(latencies, 0.50)
+        stats["p95_ms"] = _percentile_ms(latencies, 0.95)
+        stats["max_ms"] = round(latencies[-1] * 1000, 1) if latencies else 0.0
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def _percentile_ms(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return round(sorted_values[index] * 1000, 1)
+
+
+class SenderScheduler:
+    """Exécute les tâches d'un même sender dans l'ordre, les senders différents en parallèle"""
+
+    def __init__(self, workers=4, max_pending=200, burst=8, window=200):
+        self.workers = workers
+        self.max_pending = max_pending
+        # Nombre max de tâches d'un sender avant de laisser passer les autres
+        self.burst = burst
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sender-worker")
+        self._lock = threading.Lock()
+        self._queues = {}  # sender -> deque de tâches (présent = sender actif)
+        self._pending = 0
+        self._done = 0
+        self._failed = 0
+        self._rejected = 0
+        self._latencies = deque(maxlen=window)
+
+    def submit(self, key, fn, *args, **kwargs) -> Future:
+        """Ajoute une tâche dans la file du sender, lève PipelineFull si saturé"""
+        future = Future()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PipelineFull("Trop de jobs en attente")
+            self._pending += 1
+            queue = self._queues.get(key)
+            schedule = queue is None
+            if schedule:
+                queue = self._queues[key] = deque()
+            queue.append((fn, args, kwargs, future))
+
+        # Un seul drain actif par sender => ordre strict
+        if schedule:
+            self._executor.submit(self._drain, key)
+        return future
+
+    def _drain(self, key):
+        for _ in range(self.burst):
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                fn, args, kwargs, future = queue.popleft()
+            self._execute(fn, args, kwargs, future)
+
+        # Rendre la main aux autres senders (équité), le drain reprend ensuite
+        self._executor.submit(self._drain, key)
+
+    def _execute(self, fn, args, kwargs, future):
+        start = time.perf_counter()
+        failed = False
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                failed = True
+                future.set_exception(e)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._pending -= 1
+            self._latencies.append(elapsed)
+            if failed:
+                self._failed += 1
+            else:
+                self._done += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "active_senders": len(self._queues),
+                "done": self._done,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+        stats["p50_ms"] = _percentile_ms(latencies, 0.50)
+        stats["p95_ms"] = _percentile_ms(latencies, 0.95)
+        stats["max_ms"] = round(latencies[-1] * 1000, 1) if latencies else 0.0
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class JobPipeline:
+    """Pipeline de jobs: le webhook accuse réception, les étages travaillent en arrière-plan
+
+    Les jobs d'un même sender passent dans l'ordre d'arrivée, les senders
+    différents sont traités en parallèle.
+    """
+
+    def __init__(self, handler, stages, dispatchers=4, max_jobs=200):
+        # handler(job, pipeline) enchaîne les étages pour un message
+        self.handler = handler
+        self.stages = {name: StagePool(name, **config) for name, config in stages.items()}
+        self._jobs = SenderScheduler(workers=dispatchers, max_pending=max_jobs)
+
+    def stage(self, name) -> StagePool:
+        return self.stages[name]
+
+    def submit(self, job):
+        """Met un job en file derrière ceux du même sender (lève PipelineFull si saturé)"""
+        job.setdefault("received", time.time())
+        return self._jobs.submit(job.get("sender", ""), self._process, job)
+
+    def _process(self, job):
+        try:
+            return self.handler(job, self)
+        except Exception as e:
+            logger.error(f"❌ Job échoué pour {job.get('sender', '?')}: {e}")
+            raise
+
+    def stats(self) -> dict:
+        stats = {"jobs": self._jobs.stats()}
+        for name, pool in self.stages.items():
+            stats[name] = pool.stats()
+        return stats
+
+    def shutdown(self, wait=True):
+        self._jobs.shutdown(wait=wait)
+        for pool in self.stages.values():
+            pool.shutdown(wait=wait)
@@ -0,0 +1,354 @@
+# llm_router.py
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderStats:
+    """Latences et erreurs glissantes d'un fournisseur LLM"""
+
+    def __init__(self, window=100):
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)  # True = succès
+        self.last_attempt = 0.0
+
+    def record(self, latency, ok):
+        self._outcomes.append(ok)
+        if ok:
+            self._latencies.append(latency)
+
+    @property
+    def samples(self):
+        return len(self._outcomes)
+
+    @property
+    def error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return 1 - sum(self._outcomes) / len(self._outcomes)
+
+    def percentile(self, q):
+        """Latence (secondes) au quantile q, None sans mesures"""
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self):
+        p50, p95 = self.percentile(0.50), self.percentile(0.95)
+        return {
+            "samples": self.samples,
+            "error_rate": round(self.error_rate, 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class LLMProvider:
+    """Fournisseur LLM: complete(messages) -> texte"""
+
+    name = "base"
+
+    async def complete(self, messages) -> str:
+        raise NotImplementedError
+
+    async def stream(self, messages):
+        """Par défaut: la réponse complète en un seul morceau"""
+        yield await self.complete(messages)
+
+
+class PuterProvider(LLMProvider):
+    """Gemini via Puter (puterai)"""
+
+    name = "puter"
+
+    async def complete(self, messages) -> str:
+        import puterai
+        return await puterai.chat(messages)
+
+    async def stream(self, messages):
+        import puterai
+        async for sentence in puterai.stream_chat(messages):
+            yield sentence
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """API /chat/completions compatible OpenAI (OpenAI, routeur Hugging Face...)"""
+
+    def __init__(self, name, url, api_key, model, timeout=60):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+
+    def _post(self, messages):
+        response = requests.post(
+            self.url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={"model": self.model, "messages": messages},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def complete(self, messages) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._post, messages)
+
+
+class MockProvider(LLMProvider):
+    """Fournisseur local pour tester le routage hors ligne"""
+
+    def __init__(self, name="mock", latency=0.05, jitter=0.0, fail_rate=0.0, reply=None):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.reply = reply or (lambda messages: f"[{self.name}] {messages[-1]['content']}")
+        self.calls = 0
+
+    async def complete(self, messages) -> str:
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.fail_rate:
+            raise RuntimeError(f"{self.name}: échec simulé")
+        return self.reply(messages)
+
+
+class LLMRouter:
+    """Route chaque requête vers le fournisseur sain le plus rapide
+
+    - Classement par latence p50 glissante; un fournisseur dont le taux
+      d'erreur dépasse max_error_rate passe en dernier jusqu'à ce que
+      `cooldown` secondes se soient écoulées (nouvel essai).
+    - hedge_percentile (ex: 0.95): si le premier fournisseur dépasse sa
+      latence à ce quantile, une requête de secours part vers le suivant
+      et la première réponse réussie gagne.
+    """
+
+    def __init__(self, providers, window=100, max_error_rate=0.5, min_samples=5,
+                 cooldown=30, hedge_percentile=None, hedge_min_delay=0.5):
+        self.providers = list(providers)
+        self.stats = {p.name: ProviderStats(window) for p in self.providers}
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedges = 0
+
+    def healthy(self, provider) -> bool:
+        stats = self.stats[provider.name]
+        if stats.samples < self.min_samples or stats.error_rate <= self.max_error_rate:
+            return True
+        # Après le cooldown, on laisse passer une requête d'essai
+        return time.monotonic() - stats.last_attempt >= self.cooldown
+
+    def ranked(self):
+        """Fournisseurs triés: sains d'abord, puis par latence p50 (inconnus en premier)"""
+        def sort_key(provider):
+            p50 = self.stats[provider.name].percentile(0.50)
+            return (not self.healthy(provider), p50 if p50 is not None else 0.0)
+        return sorted(self.providers, key=sort_key)
+
+    async def _call(self, provider, messages, losers=None):
+        stats = self.stats[provider.name]
+        stats.last_attempt = time.monotonic()
+        start = time.perf_counter()
+        try:
+            text = await provider.complete(messages)
+        except asyncio.CancelledError:
+            # Battu par un hedge (tâche dans losers): la durée écoulée est un
+            # minorant de sa latence, on l'enregistre pour qu'un fournisseur
+            # devenu lent perde sa place au lieu d'être hedgé à chaque requête.
+            # Autre annulation (LLM_TIMEOUT): compté comme un échec.
+            hedged = losers is not None and asyncio.current_task() in losers
+            stats.record(time.perf_counter() - start, hedged)
+            raise
+        except Exception:
+            stats.record(time.perf_counter() - start, False)
+            raise
+        stats.record(time.perf_counter() - start, True)
+        return text
+
+    def _hedge_delay(self, provider):
+        latency = self.stats[provider.name].percentile(self.hedge_percentile)
+        return max(self.hedge_min_delay, latency) if latency is not None else None
+
+    async def complete(self, messages) -> str:
+        if not self.providers:
+            raise RuntimeError("Aucun fournisseur LLM configuré")
+
+        candidates = self.ranked()
+        last_error = None
+        while candidates:
+            primary = candidates.pop(0)
+            delay = self._hedge_delay(primary) if self.hedge_percentile and candidates else None
+            try:
+                if delay is None:
+                    return await self._call(primary, messages)
+                return await self._hedged(primary, candidates, messages, delay)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"⚠️ LLM {primary.name} en échec: {e}")
+        raise last_error
+
+    async def _hedged(self, primary, candidates, messages, delay):
+        losers = set()  # tâches annulées parce qu'une autre a gagné
+        first = asyncio.ensure_future(self._call(primary, messages, losers))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        # Trop lent: requête de secours vers le suivant, le plus rapide gagne
+        backup_provider = candidates.pop(0)
+        self.hedges += 1
+        logger.info(f"🪂 Hedge {primary.name} -> {backup_provider.name} après {delay * 1000:.0f} ms")
+        pending = {first, asyncio.ensure_future(self._call(backup_provider, messages, losers))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        losers.update(pending)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _open_stream(self, provider, messages, losers=None):
+        """Ouvre le flux d'un fournisseur et attend son premier morceau"""
+        stats = self.stats[provider.name]
+        stats.last_attempt = time.monotonic()
+        start = time.perf_counter()
+        chunks = provider.stream(messages).__aiter__()
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except asyncio.CancelledError:
+            # Même règle que _call: battu par un hedge = lent, sinon échec
+            hedged = losers is not None and asyncio.current_task() in losers
+            stats.record(time.perf_counter() - start, hedged)
+            raise
+        except Exception:
+            stats.record(time.perf_counter() - start, False)
+            raise
+        return provider, chunks, first, start
+
+    async def _open_hedged(self, primary, candidates, messages, delay):
+        """Premier morceau du primaire, ou du suivant si le primaire tarde (voir _hedged)"""
+        losers = set()
+        first = asyncio.ensure_future(self._open_stream(primary, messages, losers))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        backup_provider = candidates.pop(0)
+        self.hedges += 1
+        logger.info(f"🪂 Hedge (streaming) {primary.name} -> {backup_provider.name} après {delay * 1000:.0f} ms")
+        pending = {first, asyncio.ensure_future(self._open_stream(backup_provider, messages, losers))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        losers.update(pending)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, messages):
+        """Streaming depuis le meilleur fournisseur, bascule si rien n'a été produit
+
+        Avec hedge_percentile, le hedge porte sur l'attente du premier morceau:
+        le flux qui répond le premier est lu jusqu'au bout, l'autre est annulé.
+        """
+        candidates = self.ranked()
+        last_error = RuntimeError("Aucun fournisseur LLM configuré")
+        while candidates:
+            primary = candidates.pop(0)
+            delay = self._hedge_delay(primary) if self.hedge_percentile and candidates else None
+            try:
+                if delay is None:
+                    provider, chunks, first, start = await self._open_stream(primary, messages)
+                else:
+                    provider, chunks, first, start = await self._open_hedged(primary, candidates, messages, delay)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"⚠️ LLM {primary.name} en échec: {e}")
+                continue
+
+            stats = self.stats[provider.name]
+            try:
+                if first is not None:
+                    yield first
+                    async for chunk in chunks:
+                        yield chunk
+            except asyncio.CancelledError:
+                # Lecture interrompue par LLM_TIMEOUT
+                stats.record(time.perf_counter() - start, False)
+                raise
+            except Exception:
+                # Déjà commencé: impossible de basculer sans répéter le début
+                stats.record(time.perf_counter() - start, False)
+                raise
+            stats.record(time.perf_counter() - start, True)
+            return
+        raise last_error
+
+    def to_dict(self) -> dict:
+        return {
+            "providers": {name: stats.to_dict() for name, stats in self.stats.items()},
+            "order": [p.name for p in self.ranked()],
+            "hedges": self.hedges,
+        }
+
+
+def build_router() -> LLMRouter:
+    """Routeur configuré depuis l'environnement (.env)"""
+    providers = []
+    if os.getenv("LLM_MOCK") == "1":
+        providers.append(MockProvider())
+    else:
+        import puterai
+        if puterai.PuterClient is None:
+            logger.warning("⚠️ putergenai indisponible, Puter désactivé")
+        elif not all(puterai.puter_credentials()):
+            logger.warning("⚠️ PUTER_USERNAME/PUTER_PASSWORD manquants, Puter désactivé")
+        else:
+            providers.append(PuterProvider())
+
+        openai_key = os.getenv("openai_api_key") or os.getenv("OPENAI_API_KEY")
+        if openai_key:
+            providers.append(OpenAICompatibleProvider(
+                "openai", "https://api.openai.com/v1/chat/completions",
+                openai_key, os.getenv("OPENAI_MODEL", "gpt-4o-mini")))
+
+        hf_key = os.getenv("HF_API_KEY")
+        if hf_key:
+            providers.append(OpenAICompatibleProvider(
+                "huggingface", "https://router.huggingface.co/v1/chat/completions",
+                hf_key, os.getenv("HF_MODEL", "meta-llama/Llama-3.1-8B-Instruct")))
+
+    hedge = os.getenv("LLM_HEDGE_PERCENTILE")
+    return LLMRouter(
+        providers,
+        hedge_percentile=float(hedge) if hedge else None,
+        max_error_rate=float(os.getenv("LLM_MAX_ERROR_RATE", 0.5)),
+    )
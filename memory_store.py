@@ -0,0 +1,417 @@
+# memory_store.py
+import json
+import marshal
+import os
+import struct
+import threading
+import time
+import zlib
+
+# En-tête du snapshot binaire: magic, version, crc32, taille du contenu et
+# version du format marshal (non garanti stable d'une version de Python à l'autre)
+SNAPSHOT_MAGIC = b"WAMS"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<4sHIQH")
+SNAPSHOT_HEADERS = {1: struct.Struct("<4sHIQ"), 2: SNAPSHOT_HEADER}
+
+
+class SnapshotError(ValueError):
+    """Snapshot mémoire illisible ou corrompu"""
+
+
+def write_json_atomic(file_path, data, indent=2, fsync=True):
+    """Écrit un JSON via fichier temporaire + rename (jamais de fichier à moitié écrit)"""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def read_json(file_path):
+    """Charge un JSON, {} si absent; SnapshotError s'il est illisible"""
+    if not os.path.exists(file_path):
+        return {}
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except ValueError as e:  # JSONDecodeError, UnicodeDecodeError
+        raise SnapshotError(f"{file_path}: {e}") from e
+    if not isinstance(data, dict):
+        raise SnapshotError(f"{file_path}: objet JSON attendu")
+    return data
+
+
+def write_binary_snapshot(file_path, data, fsync=True):
+    """Snapshot marshal + en-tête (version, crc32), via fichier temporaire + rename"""
+    payload = marshal.dumps(data)
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, zlib.crc32(payload), len(payload), marshal.version)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def read_binary_snapshot(file_path):
+    """Charge un snapshot binaire; SnapshotError si l'en-tête, le crc32 ou le contenu est illisible"""
+    with open(file_path, 'rb') as f:
+        blob = f.read()
+    if len(blob) < 6:
+        raise SnapshotError(f"{file_path}: fichier tronqué")
+    magic, version = struct.unpack_from("<4sH", blob)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError(f"{file_path}: pas un snapshot mémoire")
+    header = SNAPSHOT_HEADERS.get(version)
+    if header is None:
+        raise SnapshotError(f"{file_path}: version {version} non supportée")
+    if len(blob) < header.size:
+        raise SnapshotError(f"{file_path}: fichier tronqué")
+    _, _, crc, size, *rest = header.unpack_from(blob)
+    # Version 1: écrit avant que la version marshal soit enregistrée
+    marshal_version = rest[0] if rest else marshal.version
+    if marshal_version > marshal.version:
+        raise SnapshotError(f"{file_path}: format marshal {marshal_version} plus récent que ce Python")
+    payload = memoryview(blob)[header.size:]
+    if len(payload) != size or zlib.crc32(payload) != crc:
+        raise SnapshotError(f"{file_path}: somme de contrôle invalide")
+    try:
+        data = marshal.loads(payload)
+    except (ValueError, EOFError, TypeError) as e:
+        # crc32 correct mais contenu illisible par ce Python
+        raise SnapshotError(f"{file_path}: contenu marshal illisible ({e})") from e
+    if not isinstance(data, dict):
+        raise SnapshotError(f"{file_path}: contenu inattendu")
+    return data
+
+
+class SnapshotFile:
+    """Snapshot complet de la mémoire, en JSON (historique) ou binaire
+
+    - json: chat_memory.json, lisible et éditable
+    - binary: chat_memory.snap (marshal, crc32), bien plus rapide à charger;
+      un chat_memory.json existant est repris au premier démarrage.
+      snapshot(compact=True) y fournit des tuples plutôt que des dicts.
+    Un snapshot corrompu n'est jamais écrasé: il est mis de côté
+    (.corrupt-<horodatage>) et signalé, puis la mémoire repart à vide.
+    """
+
+    def __init__(self, file_path, snapshot_format=None):
+        snapshot_format = snapshot_format or os.getenv("MEMORY_SNAPSHOT", "json")
+        if snapshot_format not in ("json", "binary"):
+            raise ValueError(f"Format de snapshot inconnu: {snapshot_format}")
+        self.format = snapshot_format
+        self.json_path = file_path
+        self.path = file_path if snapshot_format == "json" else f"{os.path.splitext(file_path)[0]}.snap"
+        # Le snapshot binaire stocke les utilisateurs sous forme de tuples compacts
+        self.compact = snapshot_format == "binary"
+
+    def read(self):
+        if self.format == "binary" and os.path.exists(self.path):
+            return self._read_checked(self.path, read_binary_snapshot)
+        return self._read_checked(self.json_path, read_json)
+
+    def _read_checked(self, path, reader):
+        try:
+            return reader(path)
+        except SnapshotError as e:
+            corrupt_path = f"{path}.corrupt-{int(time.time())}"
+            os.replace(path, corrupt_path)
+            print(f"❌ Snapshot mémoire corrompu ({e}), conservé dans {corrupt_path}")
+            return {}
+
+    def write(self, data, fsync=True):
+        if self.format == "binary":
+            write_binary_snapshot(self.path, data, fsync)
+        else:
+            write_json_atomic(self.path, data, fsync=fsync)
+
+
+class JsonStore:
+    """Fichier JSON complet réécrit à chaque échange (comportement historique)"""
+
+    def __init__(self, file_path, snapshot_format=None):
+        self.file_path = file_path
+        self.snapshot = SnapshotFile(file_path, snapshot_format)
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Retourne (mémoire, échanges à rejouer)"""
+        return self.snapshot.read(), []
+
+    def next_seq(self):
+        return None
+
+    def append(self, user_id, exchange, seq, snapshot):
+        self.append_batch([(user_id, exchange, seq)], snapshot)
+
+    def append_batch(self, records, snapshot):
+        # Une écriture à la fois; le snapshot pris sous le verrou est le plus récent
+        with self._lock:
+            # Fichier temporaire + rename, sans fsync (réécrit à chaque échange)
+            self.snapshot.write(snapshot(compact=self.snapshot.compact), fsync=False)
+
+    def checkpoint(self, snapshot):
+        """Snapshot complet immédiat (fermeture), avec fsync"""
+        with self._lock:
+            self.snapshot.write(snapshot(compact=self.snapshot.compact))
+
+    def close(self):
+        pass
+
+
+class JournalStore:
+    """Journal append-only: une ligne JSON par échange + snapshot compacté en arrière-plan
+
+    - chat_memory.json (ou .snap) reste le snapshot (même format que JsonStore)
+    - chat_memory.json.journal reçoit les échanges depuis le dernier snapshot
+    - fsync: "always" (chaque échange), "interval" (au plus toutes les
+      fsync_interval secondes) ou "never" (laissé à l'OS)
+    - Chaque échange porte un numéro de séquence; l'utilisateur garde le
+      dernier appliqué ('seq'), ce qui rend le rejeu idempotent.
+    """
+
+    def __init__(self, file_path, fsync=None, fsync_interval=1.0, compact_every=None, snapshot_format=None):
+        fsync = fsync or os.getenv("MEMORY_FSYNC", "interval")
+        compact_every = compact_every or int(os.getenv("MEMORY_COMPACT_EVERY", 1000))
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError(f"Politique fsync inconnue: {fsync}")
+        self.file_path = file_path
+        self.snapshot = SnapshotFile(file_path, snapshot_format)
+        self.journal_path = f"{file_path}.journal"
+        self.compacting_path = f"{file_path}.journal.compacting"
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._records = 0
+        self._last_fsync = time.monotonic()
+        self._compacting = False
+        self._journal = None
+
+    def load(self):
+        """Retourne (snapshot, échanges du journal à rejouer dans l'ordre)"""
+        data = self.snapshot.read()
+        records = []
+        for path in (self.compacting_path, self.journal_path):
+            records.extend(self._read_journal(path))
+        records.sort(key=lambda r: r["s"])
+
+        # seq: clé 'seq' (JSON) ou 3e champ du tuple compact (binaire)
+        seqs = [r["s"] for r in records] + [u[2] if isinstance(u, tuple) else u.get("seq", 0) for u in data.values()]
+        self._seq = max(seqs, default=0)
+        self._records = len(records)
+        if os.path.exists(self.compacting_path):
+            # Compaction interrompue: la relancer au prochain échange
+            self._records = max(self._records, self.compact_every)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        return data, records
+
+    def _read_journal(self, path):
+        records = []
+        if not os.path.exists(path):
+            return records
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Dernière ligne tronquée par un crash: on l'ignore
+                    print(f"⚠️ Ligne de journal illisible ignorée dans {path}")
+        return records
+
+    def next_seq(self):
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def append(self, user_id, exchange, seq, snapshot):
+        self.append_batch([(user_id, exchange, seq)], snapshot)
+
+    def append_batch(self, records, snapshot):
+        """Écrit plusieurs échanges d'un coup (un seul write, au plus un fsync)"""
+        lines = "".join(
+            json.dumps({"s": seq, "u": user_id, "m": exchange["user"], "b": exchange["bot"], "t": exchange["time"]},
+                       ensure_ascii=False) + "\n"
+            for user_id, exchange, seq in records
+        )
+        with self._lock:
+            self._journal.write(lines)
+            self._journal.flush()
+            now = time.monotonic()
+            if self.fsync == "always" or (
+                self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval
+            ):
+                os.fsync(self._journal.fileno())
+                self._last_fsync = now
+
+            self._records += len(records)
+            if self._records >= self.compact_every and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self._compact, args=(snapshot,), daemon=True).start()
+
+    def _compact(self, snapshot):
+        """Écrit un nouveau snapshot puis supprime le journal qu'il remplace"""
+        try:
+            with self._lock:
+                # Les nouveaux échanges partent dans un journal vierge
+                self._journal.close()
+                if os.path.exists(self.compacting_path):
+                    # Reste d'une compaction interrompue: on le garde en tête
+                    with open(self.compacting_path, 'a', encoding='utf-8') as dst, \
+                         open(self.journal_path, 'r', encoding='utf-8') as src:
+                        dst.write(src.read())
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, self.compacting_path)
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+                self._records = 0
+
+            self.snapshot.write(snapshot(compact=self.snapshot.compact))
+            os.remove(self.compacting_path)
+            print(f"🗜️ Journal mémoire compacté dans {self.snapshot.path}")
+        except Exception as e:
+            print(f"❌ Compaction du journal échouée: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def checkpoint(self, snapshot):
+        """Compaction immédiate et synchrone (fermeture): snapshot complet, journal vidé"""
+        while True:
+            with self._lock:
+                if not self._compacting:
+                    self._compacting = True
+                    break
+            time.sleep(0.05)
+        self._compact(snapshot)
+
+    def close(self):
+        with self._lock:
+            if self._journal and not self._journal.closed:
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._journal.close()
+
+
+class WriteBehindStore:
+    """Écriture différée: save_message ne touche que la RAM
+
+    Les échanges sont mis en attente et écrits par lots par un thread
+    dédié, au plus tard après max_delay secondes ou dès que max_dirty
+    utilisateurs ont des échanges non sauvegardés. close() vide la file.
+    """
+
+    def __init__(self, store, max_delay=None, max_dirty=None):
+        self.store = store
+        self.max_delay = max_delay or float(os.getenv("MEMORY_FLUSH_DELAY", 2.0))
+        self.max_dirty = max_dirty or int(os.getenv("MEMORY_MAX_DIRTY", 100))
+        self._cond = threading.Condition()
+        self._pending = []  # (user_id, échange, seq) dans l'ordre d'arrivée
+        self._dirty = set()
+        self._snapshot = None
+        self._closed = False
+        self._thread = None
+        self.flushes = 0
+        self.flushed = 0
+
+    def load(self):
+        data, records = self.store.load()
+        self._thread = threading.Thread(target=self._flush_loop, name="memory-flusher", daemon=True)
+        self._thread.start()
+        return data, records
+
+    def next_seq(self):
+        return self.store.next_seq()
+
+    def append(self, user_id, exchange, seq, snapshot):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Mémoire fermée")
+            self._pending.append((user_id, exchange, seq))
+            self._dirty.add(user_id)
+            self._snapshot = snapshot
+            if len(self._dirty) >= self.max_dirty:
+                self._cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.max_delay
+                while not self._closed and len(self._dirty) < self.max_dirty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Écrit tous les échanges en attente en un seul lot"""
+        with self._cond:
+            records, self._pending = self._pending, []
+            self._dirty = set()
+            snapshot = self._snapshot
+        if not records:
+            return 0
+        try:
+            self.store.append_batch(records, snapshot)
+        except Exception as e:
+            print(f"❌ Sauvegarde différée échouée: {e}")
+            # Remettre le lot en tête de file pour la prochaine tentative
+            with self._cond:
+                self._pending[:0] = records
+                self._dirty.update(user_id for user_id, _, _ in records)
+            return 0
+        self.flushes += 1
+        self.flushed += len(records)
+        return len(records)
+
+    def checkpoint(self, snapshot):
+        self.flush()
+        self.store.checkpoint(snapshot)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self.store.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "dirty_users": len(self._dirty),
+                "flushes": self.flushes,
+                "flushed": self.flushed,
+            }
+
+
+def make_store(file_path, backend="json", write_behind=None, max_delay=None, max_dirty=None, **options):
+    """Crée le backend de persistance de SimpleMemory
+
+    write_behind (ou MEMORY_WRITE_BEHIND=1) enveloppe le backend dans un
+    WriteBehindStore. snapshot_format (ou MEMORY_SNAPSHOT): json ou binary.
+    """
+    if backend == "json":
+        store = JsonStore(file_path, options.get("snapshot_format"))
+    elif backend == "journal":
+        store = JournalStore(file_path, **options)
+    else:
+        raise ValueError(f"Backend mémoire inconnu: {backend}")
+    if write_behind is None:
+        write_behind = os.getenv("MEMORY_WRITE_BEHIND", "0") == "1"
+    if write_behind:
+        return WriteBehindStore(store, max_delay=max_delay, max_dirty=max_dirty)
+    return store
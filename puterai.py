@@ -1,59 +1,242 @@
 import asyncio
+import os
+import queue
+import re
 import sys
+import threading
+import time
+from contextlib import contextmanager
 sys.path.insert(0, r'C:\Users\hp\Desktop\Whatsapp-bot')
 
 # Assurez-vous que puterai.py existe et contient ou importe PuterClient
-from putergenai.client import PuterClient
+try:
+    from putergenai.client import PuterClient
+except ImportError:
+    PuterClient = None  # le routeur LLM utilisera les autres fournisseurs
 
 sys.stdout.reconfigure(encoding="utf-8")
-async def main(prompt: str):
-    client = PuterClient()
-    #client.login("warabA", "ey)JhbGciOiJIUzI1NiI")
-    #client.login("abou",";3c+Q,uVg%]qn6u")
-    client.login("maxwell9","3c+Q,uVg%]qn6u")
-    promt=""
-    behav = [
+
+PUTER_SESSIONS = int(os.getenv("PUTER_SESSIONS", 2))  # sessions simultanées
+PUTER_REFRESH_SECONDS = int(os.getenv("PUTER_REFRESH_SECONDS", 1800))
+
+BEHAVIOR = (
+    "Tu es un assistant personnel intelligent, amical et détendu. "
+    "Tu réponds à des questions variées avec clarté et simplicité. "
+    "Tu es toujours cool et positif ."
+    " Tu fournis des réponses concises et utiles."
+    "Tu ne salues l'utilisateur que si celui ci le fait."
+    "Tu es un botte de Yann"
+    "Tu utilises des émojis de façon contextuelle pour rendre tes réponses plus vivantes."
+    "Tu parles en français ou anglais selon la langue de l'utilisateur."
+    "Tu évites le jargon technique et utilises un langage simple."
+    "Tu fournis des exemples concrets pour illustrer tes réponses."
+    "Tu encourages les utilisateurs à poser plus de questions s'ils en ont besoin."
+    "Tu aimes les animes japonais et les jeux vidéo."
+    "Tu ne reponds jamais que tu es un modèle de langage ou une IA mais tu dis que tu es un bot de yann et que ton but est de servir."
+    "Tu evites les questions politiques ou religieuses."
+    "Tu es totalement au service de la copine de Yann qui s'appelle monica et tu fais tout pour l'aider dans ses taches quotidiennes."
+)
+
+
+def puter_credentials(username=None, password=None):
+    """Identifiants Puter depuis l'environnement, jamais dans le code"""
+    return username or os.getenv("PUTER_USERNAME"), password or os.getenv("PUTER_PASSWORD")
+
+
+class PuterClientPool:
+    """Sessions Puter connectées une seule fois, rafraîchies en arrière-plan"""
+
+    def __init__(self, size=PUTER_SESSIONS, username=None, password=None,
+                 refresh_interval=PUTER_REFRESH_SECONDS):
+        # Identifiants lus au démarrage (PUTER_USERNAME/PUTER_PASSWORD, après load_dotenv)
+        self.size = max(1, size)
+        self.username = username
+        self.password = password
+        self.refresh_interval = refresh_interval
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Connecte toutes les sessions (une seule fois) et lance le rafraîchissement"""
+        with self._lock:
+            if self._started:
+                return
+            self.username, self.password = puter_credentials(self.username, self.password)
+            if not (self.username and self.password):
+                raise RuntimeError("PUTER_USERNAME et PUTER_PASSWORD doivent être définis (.env)")
+            for _ in range(self.size):
+                self._idle.put(self._login(PuterClient()))
+            self._started = True
+
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+        print(f"🔑 {self.size} session(s) Puter prête(s)")
+
+    @contextmanager
+    def session(self, timeout=60):
+        """Emprunte une session connectée, la rend au pool après usage"""
+        self.start()
+        client = self._idle.get(timeout=timeout)
+        try:
+            yield client
+        except Exception:
+            # Session peut-être expirée: on la reconnecte avant de la rendre
+            client = self._relogin(client)
+            raise
+        finally:
+            self._idle.put(client)
+
+    def _login(self, client):
+        client.login(self.username, self.password)
+        client._logged_at = time.time()
+        return client
+
+    def _relogin(self, client):
+        try:
+            return self._login(client)
+        except Exception as e:
+            print(f"⚠️ Reconnexion Puter échouée: {e}")
+            return client
+
+    def _refresh_loop(self):
+        # Rafraîchit une session inactive à la fois, sans bloquer les autres
+        while True:
+            time.sleep(max(1, self.refresh_interval // self.size))
+            try:
+                client = self._idle.get(timeout=5)
+            except queue.Empty:
+                continue
+            try:
+                if time.time() - getattr(client, "_logged_at", 0) >= self.refresh_interval:
+                    client = self._relogin(client)
+            finally:
+                self._idle.put(client)
+
+
+client_pool = PuterClientPool()
+
+
+MODEL = "google/gemini-2.0-flash"
+
+# Fin de phrase: ponctuation suivie d'un espace, ou saut de ligne
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+def build_messages(prompt, history=None):
+    """Messages envoyés au LLM: comportement du bot, historique (role/content) puis prompt"""
+    return [
     {
         "role": "system",
-        "content": (
-            "Tu es un assistant personnel intelligent, amical et détendu. "
-            "Tu réponds à des questions variées avec clarté et simplicité. "
-            "Tu es toujours cool et positif ."
-            " Tu fournis des réponses concises et utiles."
-            "Tu ne salues l'utilisateur que si celui ci le fait."
-            "Tu es un botte de Yann"
-            "Tu utilises des émojis de façon contextuelle pour rendre tes réponses plus vivantes."
-            "Tu parles en français ou anglais selon la langue de l'utilisateur."
-            "Tu évites le jargon technique et utilises un langage simple."
-            "Tu fournis des exemples concrets pour illustrer tes réponses."
-            "Tu encourages les utilisateurs à poser plus de questions s'ils en ont besoin."
-            "Tu aimes les animes japonais et les jeux vidéo."
-            "Tu ne reponds jamais que tu es un modèle de langage ou une IA mais tu dis que tu es un bot de yann et que ton but est de servir."
-            "Tu evites les questions politiques ou religieuses."
-            "Tu es totalement au service de la copine de Yann qui s'appelle monica et tu fais tout pour l'aider dans ses taches quotidiennes."
-            
-        )
+        "content": BEHAVIOR
     },
+    *(history or []),
     {
         "role": "user",
         "content": prompt
     }
 ]
 
-    result = client.ai_chat(
-        prompt=prompt,
-        options={"model": "google/gemini-2.0-flash"},
-        messages=behav
-    )
+
+def _chat(messages, stream=False):
+    """Appel bloquant à Puter avec une session du pool"""
+    options = {"model": MODEL}
+    if stream:
+        options["stream"] = True
+    with client_pool.session() as client:
+        result = client.ai_chat(
+            prompt=messages[-1]["content"],
+            options=options,
+            messages=messages
+        )
+        if stream and not isinstance(result, dict):
+            # Consommer le flux tant que la session est empruntée
+            for chunk in result:
+                yield _chunk_text(chunk)
+            return
+    yield _result_text(result)
+
+
+def _result_text(result):
     # après ton appel ai_chat
-    text = result.get("response", {}) \
+    return result.get("response", {}) \
              .get("result", {}) \
              .get("message", {}) \
              .get("content", "")
 
+
+def _chunk_text(chunk):
+    """Texte d'un morceau de flux (str, (texte, modèle) ou dict)"""
+    if isinstance(chunk, tuple):
+        chunk = chunk[0]
+    if isinstance(chunk, dict):
+        return chunk.get("text") or _result_text(chunk)
+    return chunk or ""
+
+
+async def chat(messages):
+    """Complétion Puter pour une liste de messages (role/content)"""
+    # ai_chat est synchrone: on le sort de la boucle pour garder plusieurs appels en vol
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: "".join(_chat(messages)))
+
+
+async def stream_chat(messages):
+    """Comme chat(), mais produit la réponse phrase par phrase dès qu'elle arrive
+
+    Les phrases concaténées redonnent exactement le texte complet.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for text in _chat(messages, stream=True):
+                loop.call_soon_threadsafe(chunks.put_nowait, text)
+        except Exception as e:
+            loop.call_soon_threadsafe(chunks.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(chunks.put_nowait, done)
+
+    loop.run_in_executor(None, produce)
+
+    async for sentence in split_sentences(chunks, done):
+        yield sentence
+
+
+async def split_sentences(chunks, done):
+    """Regroupe les morceaux d'une asyncio.Queue en phrases complètes"""
+    buffer = ""
+    while True:
+        chunk = await chunks.get()
+        if chunk is done:
+            break
+        if isinstance(chunk, Exception):
+            raise chunk
+        buffer += chunk
+        # Émettre chaque phrase complète (avec son séparateur)
+        position = 0
+        for match in _SENTENCE_END.finditer(buffer):
+            if match.start() > position:
+                yield buffer[position:match.end()]
+                position = match.end()
+        buffer = buffer[position:]
+
+    if buffer:
+        yield buffer
+
+
+async def main(prompt: str):
+    text = await chat(build_messages(prompt))
+
     return text
     #print(text)
 
 
-#asyncio.run(main())
+async def stream_main(prompt: str):
+    """Réponse de main() en streaming, phrase par phrase"""
+    async for sentence in stream_chat(build_messages(prompt)):
+        yield sentence
 
+
+#asyncio.run(main())
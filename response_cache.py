@@ -0,0 +1,106 @@
+# response_cache.py
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_NON_WORD = re.compile(r"[^\w\s]+", flags=re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+# Salutations et demandes d'aide: même réponse quel que soit le contexte.
+# Les autres prompts courts ("oui", "et toi ?", "raconte la suite") dépendent
+# de la conversation et ne sont jamais partagés entre utilisateurs.
+TRIVIAL_PROMPTS = frozenset({
+    "salut", "bonjour", "bonsoir", "coucou", "hello", "hi", "hey", "yo",
+    "salut toi", "bonjour a toi", "bonne nuit", "merci", "merci beaucoup",
+    "help", "aide", "menu", "start", "commandes",
+})
+
+
+def normalize_prompt(text: str) -> str:
+    """Normalise un prompt: minuscules, sans accents, ponctuation ni emojis"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _NON_WORD.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+class ResponseCache:
+    """Cache LRU + TTL des réponses LLM pour les prompts répétés
+
+    - Les prompts triviaux (salutations et aide de TRIVIAL_PROMPTS: "Salut",
+      "help"...) partagent la même réponse quel que soit le contexte, tout
+      comme les prompts sans historique.
+    - Avec context_aware=True, les autres prompts sont mis en cache avec
+      une empreinte du contexte; sinon ils ne sont pas mis en cache.
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600, trivial_prompts=TRIVIAL_PROMPTS, context_aware=True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.trivial_prompts = frozenset(normalize_prompt(p) for p in trivial_prompts)
+        self.context_aware = context_aware
+        self._entries = OrderedDict()  # clé -> (réponse, expiration)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_trivial(self, normalized: str) -> bool:
+        return normalized in self.trivial_prompts
+
+    def key(self, prompt: str, context=""):
+        """Clé de cache, ou None si le prompt ne doit pas être mis en cache
+
+        context peut être un texte ou un historique de messages role/content.
+        """
+        if not isinstance(context, str):
+            context = json.dumps(context, ensure_ascii=False, sort_keys=True) if context else ""
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return None
+        if self.is_trivial(normalized) or not context:
+            return (normalized, None)
+        if not self.context_aware:
+            return None
+        digest = hashlib.sha1(context.encode("utf-8")).hexdigest()[:16]
+        return (normalized, digest)
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, response: str):
+        if key is None or not response:
+            return
+        with self._lock:
+            self._entries[key] = (response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
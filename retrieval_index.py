@@ -0,0 +1,133 @@
+# retrieval_index.py
+import threading
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # recherche par pertinence désactivée
+
+from response_cache import normalize_prompt
+
+
+def hash_vector(text, dim=128, n=3):
+    """Vecteur L2-normalisé des n-grammes de caractères hachés (hashing trick)"""
+    text = f" {normalize_prompt(text)} "
+    buckets = [zlib.crc32(text[i:i + n].encode("utf-8")) % dim for i in range(len(text) - n + 1)]
+    vector = np.bincount(buckets, minlength=dim).astype(np.float32) if buckets else np.zeros(dim, np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class UserIndex:
+    """Vecteurs des échanges passés d'un utilisateur dans une matrice NumPy
+
+    Au plus max_items lignes (float16); au-delà, la plus ancienne est écrasée.
+    """
+
+    __slots__ = ("max_items", "vectors", "exchanges", "order", "count")
+
+    def __init__(self, dim, max_items):
+        self.max_items = max_items
+        self.vectors = np.zeros((min(16, max_items), dim), np.float16)
+        self.exchanges = []
+        self.order = []  # rang d'insertion de chaque ligne
+        self.count = 0
+
+    def add(self, exchange, vector):
+        size = len(self.exchanges)
+        if size < self.max_items:
+            if size == len(self.vectors):
+                grown = np.zeros((min(size * 2, self.max_items), self.vectors.shape[1]), np.float16)
+                grown[:size] = self.vectors
+                self.vectors = grown
+            row = size
+            self.exchanges.append(exchange)
+            self.order.append(self.count)
+        else:
+            row = self.count % self.max_items
+            self.exchanges[row] = exchange
+            self.order[row] = self.count
+        self.vectors[row] = vector
+        self.count += 1
+
+    def nbytes(self):
+        """Estimation de l'empreinte RAM (matrice + échanges gardés par l'index)"""
+        return self.vectors.nbytes + sum(100 + len(e.user) + len(e.bot) for e in self.exchanges)
+
+    def top(self, query_vector, k, skip_recent=0):
+        """Les k échanges les plus similaires, hors des skip_recent plus récents"""
+        size = len(self.exchanges)
+        if not size or k <= 0:
+            return []
+        scores = self.vectors[:size].astype(np.float32) @ query_vector
+        if skip_recent:
+            order = np.asarray(self.order)
+            scores[order >= self.count - skip_recent] = -np.inf
+        candidates = int(np.isfinite(scores).sum())
+        k = min(k, candidates)
+        if not k:
+            return []
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[scores[rows] > 0]
+        return sorted(rows.tolist(), key=lambda row: self.order[row])
+
+
+class RetrievalIndex:
+    """Index de pertinence par utilisateur (n-grammes hachés, similarité cosinus)
+
+    Reconstruit en RAM à partir de l'historique résident; non persisté.
+    """
+
+    def __init__(self, dim=128, max_items=50):
+        if np is None:
+            raise RuntimeError("NumPy est requis pour la recherche par pertinence")
+        self.dim = dim
+        self.max_items = max_items
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def _vector(self, exchange):
+        return hash_vector(f"{exchange.user} {exchange.bot}", self.dim)
+
+    def add(self, user_id, exchange, history):
+        """Indexe un nouvel échange; history sert à amorcer l'index de l'utilisateur"""
+        index = self._users.get(user_id)
+        if index is None:
+            self.seed(user_id, history)
+            return
+        index.add(exchange, self._vector(exchange))
+
+    def seed(self, user_id, history):
+        index = UserIndex(self.dim, self.max_items)
+        for exchange in history.messages():
+            index.add(exchange, self._vector(exchange))
+        with self._lock:
+            self._users[user_id] = index
+        return index
+
+    def search(self, user_id, history, query, k=3, recent=1):
+        """Les `recent` derniers échanges + les plus pertinents pour query, dans l'ordre chronologique"""
+        index = self._users.get(user_id) or self.seed(user_id, history)
+        recent = min(recent, k)
+        recent_rows = sorted(range(len(index.exchanges)), key=lambda row: index.order[row])[-recent:] if recent else []
+        rows = index.top(hash_vector(query, self.dim), k - len(recent_rows), skip_recent=len(recent_rows))
+        rows = sorted(set(rows) | set(recent_rows), key=lambda row: index.order[row])
+        return [index.exchanges[row] for row in rows]
+
+    def nbytes(self, user_id):
+        """Octets estimés de l'index d'un utilisateur (0 s'il n'est pas indexé)"""
+        index = self._users.get(user_id)
+        return index.nbytes() if index is not None else 0
+
+    def drop(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "vectors": sum(len(i.exchanges) for i in self._users.values()),
+                "bytes": sum(i.nbytes() for i in self._users.values()),
+            }
@@ -1,73 +1,421 @@
 # simple_memory.py
-import json
+import atexit
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
+from cold_storage import ColdStore
+from conversation_buffer import Exchange, UserHistory, intern_user_id, to_epoch
+from memory_store import make_store
+from retrieval_index import RetrievalIndex
+from summarizer import BackgroundSummarizer, StubSummarizer
+
+SUMMARY_HEADER = "Résumé de la conversation précédente:"
+
+def render_context(messages, summary=None):
+    """Format simple: le résumé éventuel puis une ligne Utilisateur/Assistant par message"""
+    context_lines = [SUMMARY_HEADER, summary] if summary else []
+    for msg in messages:
+        context_lines.append(f"Utilisateur: {msg.user}")
+        context_lines.append(f"Assistant: {msg.bot}")
+    
+    return "\n".join(context_lines)
+
+def render_history(messages, summary=None):
+    """Messages role/content pour le LLM: le résumé éventuel en message system"""
+    history = []
+    if summary:
+        history.append({"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"})
+    for msg in messages:
+        history.append({"role": "user", "content": msg.user})
+        if msg.bot:
+            history.append({"role": "assistant", "content": msg.bot})
+    return history
+
 class SimpleMemory:
-    """Mémoire hyper simple - juste un fichier JSON"""
+    """Mémoire hyper simple - juste un fichier JSON
+
+    Thread-safe: un verrou par utilisateur (parmi un nombre fixe de verrous,
+    MEMORY_LOCK_STRIPES, choisi par hash de l'identifiant) protège ses
+    échanges, un verrou global (tenu très brièvement) protège le
+    dictionnaire des utilisateurs.
+    En RAM, chaque utilisateur est un UserHistory (buffer circulaire de
+    max_exchanges échanges); le fichier garde le format JSON habituel.
+
+    Tiering (si idle_seconds, max_users ou max_bytes est fixé): les
+    utilisateurs inactifs ou les moins récemment utilisés sont évincés vers
+    un ColdStore compressé et rechargés à leur prochain message. Ils ne
+    figurent alors plus dans chat_memory.json mais dans le ColdStore.
+
+    Résumé (summarizer, ou MEMORY_SUMMARIZER=stub): les échanges qui sortent
+    du buffer sont repliés en arrière-plan dans un résumé par utilisateur,
+    renvoyé en tête de get_context/get_history.
+
+    Pertinence (retrieval, ou MEMORY_RETRIEVAL=1, nécessite NumPy): avec un
+    `query`, get_context/get_history renvoient le dernier échange et les
+    échanges passés les plus proches du message entrant.
+    """
     
-    def __init__(self, file_path="chat_memory.json"):
+    def __init__(self, file_path="chat_memory.json", backend=None, max_exchanges=None,
+                 idle_seconds=None, max_users=None, max_bytes=None, cold_path=None,
+                 summarizer=None, retrieval=None, **store_options):
+        # backend: "json" (fichier réécrit à chaque échange) ou "journal" (append-only)
         self.file_path = file_path
+        self.max_exchanges = max_exchanges or int(os.getenv("MEMORY_MAX_EXCHANGES", 10))
+        self.store = make_store(file_path, backend or os.getenv("MEMORY_BACKEND", "json"), **store_options)
+        self._global_lock = threading.Lock()
+        # Nombre fixe de verrous: pas un verrou de plus par expéditeur jamais vu
+        self._locks = [threading.Lock() for _ in range(int(os.getenv("MEMORY_LOCK_STRIPES", 64)))]
+        
+        # Tiering chaud/froid (0 = pas de limite)
+        self.idle_seconds = idle_seconds if idle_seconds is not None else float(os.getenv("MEMORY_IDLE_SECONDS", 0))
+        self.max_users = max_users if max_users is not None else int(os.getenv("MEMORY_MAX_USERS", 0))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("MEMORY_MAX_BYTES", 0))
+        self.cold = None
+        if self.idle_seconds or self.max_users or self.max_bytes:
+            self.cold = ColdStore(cold_path or os.getenv("MEMORY_COLD_DB", f"{file_path}.cold.db"))
+        self._lru = OrderedDict()  # user_id -> dernier accès (monotonic), du plus ancien au plus récent
+        self._sizes = {}  # user_id -> octets estimés
+        self._resident_bytes = 0
+        self.evictions = 0
+        self.reloads = 0
+        
+        # Résumé glissant des échanges sortis du buffer
+        self.summarizer = None
+        self._summaries = None
+        if summarizer is None and os.getenv("MEMORY_SUMMARIZER") == "stub":
+            summarizer = StubSummarizer(int(os.getenv("MEMORY_SUMMARY_CHARS", 600)))
+        self.set_summarizer(summarizer)
+        
+        # Index de pertinence des échanges passés
+        self.index = None
+        if retrieval if retrieval is not None else os.getenv("MEMORY_RETRIEVAL", "0") == "1":
+            try:
+                self.index = RetrievalIndex(int(os.getenv("MEMORY_INDEX_DIM", 128)),
+                                            int(os.getenv("MEMORY_INDEX_SIZE", 50)))
+            except RuntimeError as e:
+                print(f"⚠️ Recherche par pertinence désactivée: {e}")
+        
         self.memory = self._load_memory()
+        self._closed = threading.Event()
+        if self.cold is not None and self.idle_seconds:
+            threading.Thread(target=self._idle_loop, name="memory-tiering", daemon=True).start()
     
     def _load_memory(self):
-        """Charge la mémoire depuis le fichier"""
-        if os.path.exists(self.file_path):
+        """Charge la mémoire depuis le fichier (et rejoue le journal éventuel)"""
+        data, records = self.store.load()
+        cold_versions = self.cold.versions() if self.cold is not None else {}
+        self.memory = {}
+        for user_id, user in data.items():
+            # Snapshot binaire: tuples compacts; JSON: dicts
+            if isinstance(user, tuple):
+                user = UserHistory.from_record(user, self.max_exchanges)
+            else:
+                user = UserHistory.from_dict(user, self.max_exchanges)
+            # Copie froide plus récente (évincé après le dernier snapshot): elle fait foi
+            if cold_versions.get(user_id, (0, 0)) > (user.seq, user.updated):
+                continue
+            self.memory[intern_user_id(user_id)] = user
+            self._touch(user_id, user)
+        for record in records:
+            self._apply(record["u"], Exchange(record["m"], record["b"], to_epoch(record["t"])), record["s"])
+        return self.memory
+    
+    def _user_lock(self, user_id):
+        """Verrou d'un utilisateur (partagé avec les utilisateurs de même hash)
+
+        Jamais deux verrous utilisateur tenus à la fois: deux utilisateurs sur
+        le même verrou ne peuvent pas s'interbloquer.
+        """
+        return self._locks[hash(user_id) % len(self._locks)]
+    
+    def _snapshot(self, compact=False):
+        """Copie cohérente de la mémoire (sauvegarde, compaction)
+
+        compact=True: tuples UserHistory.to_record pour le snapshot binaire.
+        """
+        # Verrou global juste le temps de lister les utilisateurs
+        with self._global_lock:
+            users = list(self.memory.items())
+        
+        snapshot = {}
+        for user_id, user in users:
+            with self._user_lock(user_id):
+                snapshot[user_id] = user.to_record() if compact else user.to_dict()
+        return snapshot
+    
+    def _get_user(self, user_id):
+        """UserHistory résident, rechargé du stockage froid si besoin
+
+        L'appelant tient le verrou de l'utilisateur.
+        """
+        user = self.memory.get(user_id)
+        if user is None and self.cold is not None:
+            user = self.cold.load(user_id, self.max_exchanges)
+            if user is not None:
+                with self._global_lock:
+                    self.memory[intern_user_id(user_id)] = user
+                self.reloads += 1
+                print(f"🧊 Mémoire rechargée du stockage froid pour {user_id}")
+        if user is not None:
+            self._touch(user_id, user)
+        return user
+    
+    def _touch(self, user_id, user):
+        """Met à jour l'ordre LRU et la taille estimée (tiering uniquement)
+
+        La taille compte aussi l'index de pertinence de l'utilisateur.
+        """
+        if self.cold is None:
+            return
+        size = user.nbytes()
+        if self.index is not None:
+            size += self.index.nbytes(user_id)
+        with self._global_lock:
+            self._lru[user_id] = time.monotonic()
+            self._lru.move_to_end(user_id)
+            self._resident_bytes += size - self._sizes.get(user_id, 0)
+            self._sizes[user_id] = size
+    
+    def _evict(self, user_id):
+        """Déplace un utilisateur vers le stockage froid"""
+        with self._user_lock(user_id):
+            user = self.memory.get(user_id)
+            if user is not None:
+                self.cold.save(user_id, user)
+            if self.index is not None:
+                self.index.drop(user_id)
+            with self._global_lock:
+                self.memory.pop(user_id, None)
+                self._lru.pop(user_id, None)
+                self._resident_bytes -= self._sizes.pop(user_id, 0)
+            if user is not None:
+                self.evictions += 1
+    
+    def _over_limits(self):
+        return (self.max_users and len(self._lru) > self.max_users) or \
+               (self.max_bytes and self._resident_bytes > self.max_bytes)
+    
+    def _enforce_limits(self):
+        """Évince les utilisateurs les moins récemment utilisés au-delà des limites"""
+        while True:
+            with self._global_lock:
+                if len(self._lru) <= 1 or not self._over_limits():
+                    return
+                user_id = next(iter(self._lru))
+            self._evict(user_id)
+    
+    def evict_idle(self):
+        """Évince les utilisateurs inactifs depuis plus de idle_seconds"""
+        deadline = time.monotonic() - self.idle_seconds
+        with self._global_lock:
+            idle = []
+            for user_id, last_access in self._lru.items():
+                if last_access > deadline:
+                    break
+                idle.append(user_id)
+        for user_id in idle:
+            self._evict(user_id)
+        if idle:
+            print(f"🧊 {len(idle)} utilisateur(s) inactif(s) évincé(s) vers le stockage froid")
+        return len(idle)
+    
+    def _idle_loop(self):
+        interval = min(max(self.idle_seconds / 2, 1), 60)
+        while not self._closed.wait(interval):
             try:
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-    
-    def _save_memory(self):
-        """Sauvegarde la mémoire dans le fichier"""
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.memory, f, ensure_ascii=False, indent=2)
-    
-    def get_context(self, user_id, max_messages=3):
-        """Récupère les derniers messages d'un utilisateur"""
-        if user_id not in self.memory:
-            return ""
+                self.evict_idle()
+            except Exception as e:
+                print(f"❌ Éviction des utilisateurs inactifs échouée: {e}")
+    
+    def set_summarizer(self, summarizer):
+        """Active (ou remplace) le résumeur: objet avec summarize(résumé, échanges)"""
+        self.summarizer = summarizer
+        if summarizer is not None and self._summaries is None:
+            self._summaries = BackgroundSummarizer(self._fold)
+    
+    def _fold(self, user_id, exchanges):
+        """Intègre des échanges évincés au résumé de l'utilisateur (thread du résumeur)"""
+        with self._user_lock(user_id):
+            user = self._get_user(user_id)
+            if user is None:
+                return
+            summary = user.summary
         
-        # Récupérer les derniers messages
-        messages = self.memory[user_id].get('messages', [])
-        last_messages = messages[-max_messages:]  # 3 derniers
+        # L'appel au résumeur (potentiellement un LLM) se fait hors du verrou
+        summary = self.summarizer.summarize(summary or "", exchanges)
+        with self._user_lock(user_id):
+            user = self._get_user(user_id)
+            if user is not None:
+                user.summary = summary or None
+                user.rendered = None
+    
+    def _last_messages(self, user_id, max_messages):
+        with self._user_lock(user_id):
+            user = self._get_user(user_id)
+            messages = user.last(max_messages) if user is not None else []
+        if self.cold is not None:
+            self._enforce_limits()
+        return messages
+    
+    def get_relevant(self, user_id, query, max_messages=3):
+        """Dernier échange + échanges passés les plus pertinents pour query"""
+        with self._user_lock(user_id):
+            user = self._get_user(user_id)
+            if user is None:
+                return [], None
+            relevant = self.index.search(user_id, user, query, max_messages, int(os.getenv("MEMORY_RETRIEVAL_RECENT", 1)))
+            # La recherche peut amorcer l'index: sa taille entre dans le tiering
+            self._touch(user_id, user)
+            return relevant, user.summary
+    
+    def _rendered(self, user_id, key, render):
+        """Rendu mémorisé dans user.rendered[key], invalidé à chaque nouvel échange"""
+        with self._user_lock(user_id):
+            user = self._get_user(user_id)
+            if user is None:
+                return None
+            if user.rendered is None:
+                user.rendered = {}
+            value = user.rendered.get(key)
+            if value is None:
+                value = user.rendered[key] = render(user)
+        # Un rechargement du stockage froid peut faire dépasser les limites
+        if self.cold is not None:
+            self._enforce_limits()
+        return value
+    
+    def get_context(self, user_id, max_messages=3, query=None):
+        """Récupère les derniers messages d'un utilisateur
+
+        Le texte est mémorisé par utilisateur et par max_messages, et
+        invalidé à chaque nouvel échange. Avec query (et l'index de
+        pertinence), les échanges les plus pertinents remplacent les derniers.
+        """
+        if query and self.index is not None:
+            messages, summary = self.get_relevant(user_id, query, max_messages)
+            return render_context(messages, summary)
         
-        # Format simple
-        context_lines = []
-        for msg in last_messages:
-            context_lines.append(f"Utilisateur: {msg.get('user', '')}")
-            context_lines.append(f"Assistant: {msg.get('bot', '')}")
+        context = self._rendered(user_id, max_messages,
+                                 lambda user: render_context(user.last(max_messages), user.summary))
+        return context or ""
+    
+    def get_history(self, user_id, max_messages=3, query=None):
+        """Derniers échanges sous forme de messages role/content pour le LLM
+
+        Le résumé éventuel est un premier message system. Mémorisé comme
+        get_context (les dicts renvoyés sont partagés: ne pas les modifier).
+        Avec query, voir get_context.
+        """
+        if query and self.index is not None:
+            messages, summary = self.get_relevant(user_id, query, max_messages)
+            return render_history(messages, summary)
         
-        return "\n".join(context_lines)
+        history = self._rendered(user_id, ("history", max_messages),
+                                 lambda user: render_history(user.last(max_messages), user.summary))
+        return list(history) if history else []
+    
+    def get_summary(self, user_id):
+        """Résumé des échanges plus anciens que le buffer (ou None)"""
+        if self._summaries is None:
+            return None
+        with self._user_lock(user_id):
+            user = self._get_user(user_id)
+            return user.summary if user is not None else None
+    
+    def _apply(self, user_id, exchange, seq=None):
+        """Ajoute un échange en mémoire (sauvegarde ou rejeu du journal)
+
+        L'appelant tient le verrou de l'utilisateur.
+        """
+        user = self._get_user(user_id)
+        if user is None:
+            with self._global_lock:
+                user = self.memory[intern_user_id(user_id)] = UserHistory(self.max_exchanges, exchange.time)
+        
+        # Rejeu: échange déjà présent dans le snapshot
+        if seq is not None and seq <= user.seq:
+            return
+        
+        # Ajouter le nouvel échange (le buffer ne garde que les max_exchanges derniers)
+        evicted = user.append(exchange)
+        if evicted is not None and self._summaries is not None:
+            self._summaries.submit(user_id, evicted)
+        if self.index is not None:
+            self.index.add(user_id, exchange, user)
+        if seq is not None:
+            user.seq = seq
+        self._touch(user_id, user)
     
     def save_message(self, user_id, user_message, bot_response):
         """Sauvegarde un échange"""
-        if user_id not in self.memory:
-            self.memory[user_id] = {
-                'created': datetime.now().isoformat(),
-                'messages': []
-            }
-        
-        # Ajouter le nouvel échange
-        self.memory[user_id]['messages'].append({
+        exchange = {
             'user': user_message,
             'bot': bot_response,
             'time': datetime.now().isoformat()
-        })
-        
-        # Garder seulement les 10 derniers messages (pour éviter que le fichier grossisse)
-        if len(self.memory[user_id]['messages']) > 10:
-            self.memory[user_id]['messages'] = self.memory[user_id]['messages'][-10:]
+        }
+        # Numéro de séquence pris sous le verrou: croissant pour chaque utilisateur
+        with self._user_lock(user_id):
+            seq = self.store.next_seq()
+            self._apply(user_id, Exchange(user_message, bot_response, to_epoch(exchange['time'])), seq)
         
-        # Mettre à jour la date
-        self.memory[user_id]['updated'] = datetime.now().isoformat()
-        
-        # Sauvegarder
-        self._save_memory()
+        # Sauvegarder (réécriture complète ou une ligne de journal selon le backend)
+        # hors du verrou utilisateur: le snapshot prend les verrous des autres
+        self.store.append(user_id, exchange, seq, self._snapshot)
+        if self.cold is not None:
+            self._enforce_limits()
         
         print(f"💾 Mémoire sauvegardée pour {user_id}")
+    
+    def stats(self) -> dict:
+        stats = {"resident_users": len(self.memory)}
+        if self._summaries is not None:
+            stats["summaries"] = {
+                "pending": self._summaries.pending(),
+                "folded": self._summaries.folded,
+                "failed": self._summaries.failed,
+            }
+        if self.index is not None:
+            stats["retrieval"] = self.index.stats()
+        if self.cold is not None:
+            stats.update({
+                "resident_bytes": self._resident_bytes,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+                "cold": self.cold.stats(),
+            })
+        return stats
+    
+    def flush(self):
+        """Écrit tout de suite les échanges en attente (écriture différée), sans fermer"""
+        if hasattr(self.store, "flush"):
+            self.store.flush()
+    
+    def close(self):
+        """Ferme proprement le backend (flush du journal); sans effet la deuxième fois"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._summaries is not None:
+            # Résumés en attente intégrés puis sauvegardés: un résumé n'est
+            # sinon écrit qu'au prochain échange, qui n'arrivera plus
+            self._summaries.stop()
+            if self._summaries.folded:
+                self.store.checkpoint(self._snapshot)
+        self.store.close()
+        if self.cold is not None:
+            self.cold.close()
+
+def create_memory(file_path="chat_memory.json"):
+    """Crée la mémoire selon MEMORY_BACKEND: json (défaut), journal ou sqlite"""
+    backend = os.getenv("MEMORY_BACKEND", "json")
+    if backend == "sqlite":
+        from sqlite_memory import SqliteMemory
+        return SqliteMemory(os.getenv("MEMORY_DB", "chat_memory.db"), import_json=file_path)
+    return SimpleMemory(file_path, backend=backend)
 
 # Instance globale - UNE SEULE LIGNE à ajouter
-memory = SimpleMemory()
\ No newline at end of file
+memory = create_memory()
+atexit.register(memory.close)
@@ -0,0 +1,123 @@
+# speaker_cache.py
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from memory_store import read_json, write_json_atomic
+
+
+def parse_voices(spec):
+    """"femme2=femme2.wav,homme=voix/homme.wav" -> {nom: wav de référence}"""
+    voices = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, path = item.partition("=")
+        voices[name.strip()] = (path or name).strip()
+    return voices
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SpeakerEmbeddingCache:
+    """Embeddings de locuteur calculés une seule fois par wav de référence
+
+    Clé = sha256 du wav + modèle (un embedding YourTTS ne sert pas à XTTS).
+    Les embeddings sont gardés en RAM et dans cache_dir (.npz), donc
+    rechargés sans ré-encoder le wav au démarrage suivant.
+    """
+
+    def __init__(self, voices=None, cache_dir="speaker_cache"):
+        self.voices = voices or parse_voices(os.getenv("TTS_VOICES", "femme2=femme2.wav"))
+        self.default_voice = next(iter(self.voices))
+        self.cache_dir = cache_dir
+        self._embeddings = {}  # (hash, modèle) -> {nom: np.ndarray}
+        self._hashes = {}  # chemin -> (mtime, hash)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def resolve(self, voice):
+        """Nom de voix connu (la voix par défaut sinon)"""
+        return voice if voice in self.voices else self.default_voice
+
+    def wav_path(self, voice):
+        return self.voices[self.resolve(voice)]
+
+    def voice_id(self, voice):
+        """Nom + empreinte du wav (pour les clés du cache audio)"""
+        return f"{self.resolve(voice)}:{self._file_hash(self.wav_path(voice))[:16]}"
+
+    def _file_hash(self, path):
+        mtime = os.path.getmtime(path)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        digest = file_hash(path)
+        self._hashes[path] = (mtime, digest)
+        return digest
+
+    def get(self, voice, model_name, compute):
+        """Embedding de la voix pour ce modèle; compute(wav) -> {nom: array} si absent"""
+        path = self.wav_path(voice)
+        digest = self._file_hash(path)
+        key = (digest, model_name)
+        embedding = self._embeddings.get(key)
+        if embedding is not None:
+            return embedding
+
+        with self._lock:
+            embedding = self._embeddings.get(key)
+            if embedding is not None:
+                return embedding
+            model_tag = hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:8]
+            npz_path = os.path.join(self.cache_dir, f"{digest}_{model_tag}.npz")
+            if os.path.exists(npz_path):
+                with np.load(npz_path) as data:
+                    embedding = {name: data[name] for name in data.files}
+            else:
+                print(f"🎙️ Encodage de la voix {self.resolve(voice)} ({path})")
+                embedding = compute(path)
+                tmp_path = f"{npz_path}.tmp.npz"
+                np.savez(tmp_path, **embedding)
+                os.replace(tmp_path, npz_path)
+            self._embeddings[key] = embedding
+            return embedding
+
+    def preload(self, model_name, compute):
+        """Charge (ou calcule) l'embedding de toutes les voix configurées"""
+        for voice in self.voices:
+            try:
+                self.get(voice, model_name, compute)
+            except Exception as e:
+                print(f"⚠️ Voix {voice} indisponible: {e}")
+
+
+class UserVoices:
+    """Voix choisie par chaque utilisateur (fichier JSON)"""
+
+    def __init__(self, file_path="user_voices.json"):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        try:
+            self._choices = read_json(file_path)
+        except ValueError as e:
+            print(f"⚠️ {e}: choix de voix ignorés")
+            self._choices = {}
+
+    def get(self, user_id):
+        return self._choices.get(user_id)
+
+    def set(self, user_id, voice):
+        with self._lock:
+            self._choices[user_id] = voice
+            write_json_atomic(self.file_path, self._choices)
+
+
+speaker_cache = SpeakerEmbeddingCache()
+user_voices = UserVoices(os.getenv("USER_VOICES_FILE", "user_voices.json"))
@@ -0,0 +1,140 @@
+# sqlite_memory.py
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class SqliteMemory:
+    """Mémoire conversationnelle dans SQLite (mode WAL)
+
+    Même API que SimpleMemory, mais rien n'est chargé en RAM:
+    get_context est une requête indexée, save_message un INSERT suivi de la
+    suppression des échanges au-delà des max_exchanges derniers de
+    l'utilisateur (même transaction), comme le buffer de SimpleMemory.
+    Plusieurs process d'une même machine peuvent partager la base.
+    """
+
+    def __init__(self, db_path="chat_memory.db", import_json=None, max_exchanges=None):
+        self.db_path = db_path
+        self.max_exchanges = max_exchanges or int(os.getenv("MEMORY_MAX_EXCHANGES", 10))
+        self._local = threading.local()  # une connexion par thread
+        db = self._db()
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS exchanges (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                user_msg TEXT NOT NULL,
+                bot_msg TEXT NOT NULL,
+                time TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_exchanges_user_time ON exchanges (user_id, time);
+        """)
+        db.commit()
+        if import_json:
+            self._import_json(import_json)
+        # Bases créées avant la limite par utilisateur
+        deleted = self.prune(self.max_exchanges)
+        if deleted:
+            print(f"🧹 {deleted} anciens échanges supprimés de {db_path}")
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _import_json(self, file_path):
+        """Importe chat_memory.json une seule fois (base vide)"""
+        if not os.path.exists(file_path):
+            return
+        db = self._db()
+        # Verrou d'écriture: un seul process fait l'import
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if db.execute("SELECT 1 FROM exchanges LIMIT 1").fetchone():
+                db.rollback()
+                return
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            rows = [
+                (user_id, msg.get('user', ''), msg.get('bot', ''), msg.get('time', ''))
+                for user_id, user in data.items()
+                for msg in user.get('messages', [])
+            ]
+            db.executemany(
+                "INSERT INTO exchanges (user_id, user_msg, bot_msg, time) VALUES (?, ?, ?, ?)", rows
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        print(f"📥 {len(rows)} échanges importés depuis {file_path}")
+
+    def _last(self, user_id, max_messages):
+        rows = self._db().execute(
+            "SELECT user_msg, bot_msg FROM exchanges WHERE user_id = ? "
+            "ORDER BY time DESC, id DESC LIMIT ?",
+            (user_id, max_messages),
+        ).fetchall()
+        rows.reverse()
+        return rows
+
+    def get_context(self, user_id, max_messages=3, query=None):
+        """Récupère les derniers messages d'un utilisateur (query ignoré)"""
+        context_lines = []
+        for user_msg, bot_msg in self._last(user_id, max_messages):
+            context_lines.append(f"Utilisateur: {user_msg}")
+            context_lines.append(f"Assistant: {bot_msg}")
+        return "\n".join(context_lines)
+
+    def get_history(self, user_id, max_messages=3, query=None):
+        """Derniers échanges sous forme de messages role/content pour le LLM (query ignoré)"""
+        history = []
+        for user_msg, bot_msg in self._last(user_id, max_messages):
+            history.append({"role": "user", "content": user_msg})
+            if bot_msg:
+                history.append({"role": "assistant", "content": bot_msg})
+        return history
+
+    def save_message(self, user_id, user_message, bot_response):
+        """Sauvegarde un échange"""
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT INTO exchanges (user_id, user_msg, bot_msg, time) VALUES (?, ?, ?, ?)",
+                (user_id, user_message, bot_response, datetime.now().isoformat()),
+            )
+            # Seuls les max_exchanges derniers sont gardés (parcours de l'index user_id, time)
+            db.execute(
+                "DELETE FROM exchanges WHERE id IN ("
+                "SELECT id FROM exchanges WHERE user_id = ? "
+                "ORDER BY time DESC, id DESC LIMIT -1 OFFSET ?)",
+                (user_id, self.max_exchanges),
+            )
+        print(f"💾 Mémoire sauvegardée pour {user_id}")
+
+    def prune(self, keep=10):
+        """Maintenance: ne garde que les `keep` derniers échanges par utilisateur"""
+        db = self._db()
+        with db:
+            deleted = db.execute("""
+                DELETE FROM exchanges WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (
+                            PARTITION BY user_id ORDER BY time DESC, id DESC
+                        ) AS rank FROM exchanges
+                    ) WHERE rank > ?
+                )
+            """, (keep,)).rowcount
+        return deleted
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
@@ -0,0 +1,109 @@
+# summarizer.py
+import queue
+import threading
+
+SUMMARY_PROMPT = (
+    "Tu résumes une conversation WhatsApp entre un utilisateur et un assistant. "
+    "Intègre les nouveaux échanges au résumé existant en quelques phrases, en français, "
+    "en gardant les faits utiles sur l'utilisateur (prénom, projets, préférences, questions en cours)."
+)
+
+
+def _shorten(text, max_chars):
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+
+class StubSummarizer:
+    """Résumé local déterministe (tests, ou sans LLM)
+
+    Garde une ligne courte par message utilisateur évincé, en abandonnant
+    les plus anciennes pour tenir dans max_chars.
+    """
+
+    def __init__(self, max_chars=600, line_chars=80):
+        self.max_chars = max_chars
+        self.line_chars = line_chars
+
+    def summarize(self, summary, exchanges):
+        lines = summary.splitlines() if summary else []
+        lines.extend(f"- {_shorten(e.user, self.line_chars)}" for e in exchanges if e.user.strip())
+        while lines and len("\n".join(lines)) > self.max_chars:
+            lines.pop(0)
+        return "\n".join(lines)
+
+
+class LLMSummarizer:
+    """Résumé par le LLM; complete(messages) -> texte (appel bloquant)"""
+
+    def __init__(self, complete, max_chars=600):
+        self.complete = complete
+        self.max_chars = max_chars
+        self.fallback = StubSummarizer(max_chars)
+
+    def summarize(self, summary, exchanges):
+        turns = "\n".join(f"Utilisateur: {e.user}\nAssistant: {e.bot}" for e in exchanges)
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Résumé actuel:\n{summary or '(vide)'}\n\nNouveaux échanges:\n{turns}"},
+        ]
+        try:
+            text = (self.complete(messages) or "").strip()
+        except Exception as e:
+            print(f"⚠️ Résumé LLM échoué, résumé local: {e}")
+            return self.fallback.summarize(summary, exchanges)
+        return _shorten(text, self.max_chars) if text else summary
+
+
+class BackgroundSummarizer:
+    """Thread qui replie les échanges évincés dans le résumé de chaque utilisateur
+
+    fold(user_id, exchanges) fait le travail; les échanges en attente d'un
+    même utilisateur sont regroupés en un seul appel.
+    """
+
+    def __init__(self, fold, name="memory-summarizer"):
+        self.fold = fold
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self.folded = 0
+        self.failed = 0
+
+    def submit(self, user_id, exchange):
+        self._queue.put((user_id, exchange))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # Regrouper tout ce qui attend déjà, par utilisateur
+            pending = {}
+            stop = False
+            while item is not None:
+                user_id, exchange = item
+                pending.setdefault(user_id, []).append(exchange)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                stop = True
+            for user_id, exchanges in pending.items():
+                try:
+                    self.fold(user_id, exchanges)
+                    self.folded += len(exchanges)
+                except Exception as e:
+                    self.failed += len(exchanges)
+                    print(f"❌ Résumé de {user_id} échoué: {e}")
+            if stop:
+                return
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stop(self, timeout=10):
+        """Termine les résumés en attente puis arrête le thread"""
+        self._queue.put(None)
+        self._thread.join(timeout)
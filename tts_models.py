@@ -0,0 +1,157 @@
+# tts_models.py
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from speaker_cache import speaker_cache
+
+# Modèles Coqui connus et langue française attendue par chacun
+COQUI_MODELS = {
+    "your_tts": ("tts_models/multilingual/multi-dataset/your_tts", "fr-fr"),
+    # xtts_v2 demande d'accepter la licence CPML (COQUI_TOS_AGREED=1)
+    "xtts_v2": ("tts_models/multilingual/multi-dataset/xtts_v2", "fr"),
+}
+
+
+def compute_speaker_embedding(tts, wav_path):
+    """Encode un wav de référence: latents XTTS ou d-vector (YourTTS)"""
+    import numpy as np
+    model = tts.synthesizer.tts_model
+    if hasattr(model, "get_conditioning_latents"):
+        gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(audio_path=[wav_path])
+        return {"gpt_cond_latent": gpt_cond_latent.cpu().numpy(),
+                "speaker_embedding": speaker_embedding.cpu().numpy()}
+    d_vector = model.speaker_manager.compute_embedding_from_clip(wav_path)
+    return {"d_vector": np.asarray(d_vector, dtype=np.float32)}
+
+
+def synthesize_with_embedding(tts, text, language, embedding, voice):
+    """Synthèse à partir d'un embedding déjà calculé: (échantillons, fréquence)"""
+    model = tts.synthesizer.tts_model
+    if "gpt_cond_latent" in embedding:
+        import torch
+        out = model.inference(
+            text, language,
+            torch.from_numpy(embedding["gpt_cond_latent"]).to(model.device),
+            torch.from_numpy(embedding["speaker_embedding"]).to(model.device),
+        )
+        return out["wav"], model.config.audio.output_sample_rate
+    # YourTTS: le d-vector est enregistré comme locuteur nommé du modèle
+    manager = model.speaker_manager
+    if voice not in manager.embeddings_by_names:
+        manager.embeddings_by_names[voice] = [embedding["d_vector"].tolist()]
+    return tts.tts(text=text, speaker=voice, language=language), tts.synthesizer.output_sample_rate
+
+
+class CoquiModelPool:
+    """Instances Coqui TTS chargées une seule fois et gardées chaudes
+
+    size instances pour autant de synthèses simultanées; chaque appel en
+    emprunte une. Les temps de chargement et les latences d'inférence sont
+    exposés par stats(). Les voix (TTS_VOICES) sont encodées une seule
+    fois par SpeakerEmbeddingCache.
+    """
+
+    def __init__(self, model=None, size=None, device=None, window=200):
+        model = model or os.getenv("COQUI_MODEL", "your_tts")
+        self.model_name, self.language = COQUI_MODELS.get(model, (model, os.getenv("COQUI_LANGUAGE", "fr")))
+        self.size = max(1, size or int(os.getenv("COQUI_INSTANCES", 1)))
+        self.device = device or os.getenv("COQUI_DEVICE") or None
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._latencies = deque(maxlen=window)
+        self.load_times = []
+        self.calls = 0
+        self.errors = 0
+
+    def start(self):
+        """Charge toutes les instances (une seule fois)"""
+        with self._lock:
+            if self._started:
+                return
+            # Import tardif: torch/Coqui ne sont chargés qu'avec TTS_ENGINE=coqui
+            try:
+                from TTS.api import TTS
+            except ImportError:
+                raise RuntimeError("Coqui TTS n'est pas installé (pip install TTS)")
+            for _ in range(self.size):
+                start = time.perf_counter()
+                tts = TTS(self.model_name)
+                if self.device:
+                    tts = tts.to(self.device)
+                self.load_times.append(time.perf_counter() - start)
+                self._idle.put(tts)
+            self._started = True
+            # Embeddings des voix chargés (ou calculés) avant la première synthèse
+            tts = self._idle.get()
+            try:
+                speaker_cache.preload(self.model_name, lambda wav: compute_speaker_embedding(tts, wav))
+            finally:
+                self._idle.put(tts)
+        print(f"🗣️ {self.size} instance(s) {self.model_name} prête(s) "
+              f"(chargement {sum(self.load_times):.1f}s)")
+
+    @contextmanager
+    def session(self, timeout=120):
+        """Emprunte une instance chargée, la rend au pool après usage"""
+        self.start()
+        tts = self._idle.get(timeout=timeout)
+        try:
+            yield tts
+        finally:
+            self._idle.put(tts)
+
+    def _timed(self, fn):
+        with self.session() as tts:
+            start = time.perf_counter()
+            try:
+                result = fn(tts)
+            except Exception:
+                self.errors += 1
+                raise
+            self._latencies.append(time.perf_counter() - start)
+            self.calls += 1
+            return result
+
+    def synthesize(self, text, voice=None, language=None):
+        """Synthèse avec une voix nommée, sans ré-encoder son wav: (échantillons, fréquence)"""
+        voice = speaker_cache.resolve(voice)
+        language = language or self.language
+
+        def run(tts):
+            embedding = speaker_cache.get(voice, self.model_name, lambda wav: compute_speaker_embedding(tts, wav))
+            try:
+                return synthesize_with_embedding(tts, text, language, embedding, voice)
+            except Exception as e:
+                # API interne Coqui différente: encodage du wav à chaque appel
+                print(f"⚠️ Embedding de {voice} inutilisable ({e}), synthèse depuis le wav")
+                return tts.tts(text=text, speaker_wav=speaker_cache.wav_path(voice), language=language), \
+                    tts.synthesizer.output_sample_rate
+        return self._timed(run)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile_ms(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+
+        return {
+            "model": self.model_name,
+            "instances": self.size if self._started else 0,
+            "idle": self._idle.qsize(),
+            "load_ms": [round(t * 1000, 1) for t in self.load_times],
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": percentile_ms(0.50),
+            "p95_ms": percentile_ms(0.95),
+        }
+
+
+# Instance globale (chargée au premier usage ou par start())
+coqui_pool = CoquiModelPool()
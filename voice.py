@@ -1,17 +1,20 @@
 #voice.py
+import io
 import os
 import requests
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from gtts import gTTS
 import pyttsx3
 from pydub import AudioSegment
-import numpy as np
-import librosa, scipy
-import soundfile as sf
 sys.path.insert(0, r'C:\Users\hp\AppData\Local\Programs\Python\Python39\Lib\site-packages\elevenlabs')
 
 sys.stdout.reconfigure(encoding="utf-8")
 from elevenlabs import ElevenLabs, play
+from audio_cache import audio_cache, discard_output
+from speaker_cache import speaker_cache, user_voices
+from tts_models import coqui_pool
+from audio_post import crossfade_concat, post_processor
 #api_key=os.getenv("ELEVENLABS_API_KEY")
 
 # ElevenLabs Text-to-Voice
@@ -39,45 +42,131 @@ def text_to_voice(prompt, filename,voice_id):
         for chunk in audio_stream:
             if chunk:
                 f.write(chunk)
+import re
+EMOJI_PATTERN = re.compile(
+    
+    "["
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map
+    "\U0001F700-\U0001F77F"
+    "*"
+    "\U0001F780-\U0001F7FF"
+    "\U0001F800-\U0001F8FF"
+    "\U0001F900-\U0001F9FF"
+    "\U0001FA00-\U0001FAFF"
+    "\U00002702-\U000027B0"
+    "]+",
+    flags=re.UNICODE
+)
+
+def remove_emojis(text):
+    return EMOJI_PATTERN.sub('', text)
+
+# Synthèse par phrases en parallèle pour les longues réponses (TTS_PARALLEL=1)
+TTS_PARALLEL = os.getenv("TTS_PARALLEL", "0") == "1"
+TTS_PARALLEL_MIN_CHARS = int(os.getenv("TTS_PARALLEL_MIN_CHARS", 300))
+TTS_PARALLEL_WORKERS = int(os.getenv("TTS_PARALLEL_WORKERS", 4))
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", 250))
+TTS_CROSSFADE_MS = int(os.getenv("TTS_CROSSFADE_MS", 30))
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+_sentence_pool = None
+
+def split_sentences(text, max_chars=TTS_CHUNK_CHARS):
+    """Découpe aux fins de phrase, en regroupant les phrases courtes jusqu'à max_chars"""
+    chunks, current = [], ""
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+def sentence_chunks(clean_text):
+    """Morceaux à synthétiser en parallèle (un seul si le mode est désactivé ou le texte court)"""
+    if not TTS_PARALLEL or len(clean_text) < TTS_PARALLEL_MIN_CHARS:
+        return [clean_text]
+    return split_sentences(clean_text)
+
+def synthesize_in_order(synthesize, chunks):
+    """Synthétise les morceaux en parallèle; résultats dans l'ordre du texte"""
+    global _sentence_pool
+    if len(chunks) == 1:
+        return [synthesize(chunks[0])]
+    if _sentence_pool is None:
+        _sentence_pool = ThreadPoolExecutor(max_workers=TTS_PARALLEL_WORKERS, thread_name_prefix="tts-sentence")
+    return list(_sentence_pool.map(synthesize, chunks))
+
+def _gtts_segment(text):
+    buffer = io.BytesIO()
+    gTTS(text=text, lang='fr', slow=False).write_to_fp(buffer)
+    buffer.seek(0)
+    return AudioSegment.from_file(buffer, format="mp3")
+
+def gtts_parallel(chunks, output_path):
+    """gTTS phrase par phrase en parallèle, assemblé avec fondu enchaîné en un seul mp3"""
+    audio = None
+    for segment in synthesize_in_order(_gtts_segment, chunks):
+        if audio is None:
+            audio = segment
+        else:
+            audio = audio.append(segment, crossfade=min(TTS_CROSSFADE_MS, len(audio), len(segment)))
+    audio.export(output_path, format="mp3")
+
+# Clés du cache audio: moteur, langue et paramètres de chaque TTS gratuit
+GTTS_KEY = {"engine": "gtts", "language": "fr", "params": {"slow": False}}
+GTTS_PARALLEL_KEY = {"engine": "gtts", "language": "fr",
+                     "params": {"slow": False, "chunk_chars": TTS_CHUNK_CHARS, "crossfade_ms": TTS_CROSSFADE_MS}}
+PYTTSX3_KEY = {"engine": "pyttsx3", "language": "fr", "params": {"rate": 200}}
+
+def _gtts_key(clean_text):
+    return GTTS_PARALLEL_KEY if len(sentence_chunks(clean_text)) > 1 else GTTS_KEY
+
+def fetch_cached_voice(text, output_path):
+    """Copie vers output_path l'audio déjà généré pour ce texte (gTTS puis pyttsx3)"""
+    clean_text = remove_emojis(text).strip()
+    if not clean_text:
+        return False
+    return audio_cache.fetch_first([audio_cache.key(clean_text, **key) for key in (_gtts_key(clean_text), PYTTSX3_KEY)],
+                                   output_path)
+
 ##en utilisant google text to speech ou le pc
-def text_to_voices(text, output_path, voice_id=None):
+def text_to_voices(text, output_path, voice_id=None, check_cache=True):
     """
     Convert text to speech using free methods
     voice_id parameter kept for compatibility but not used
+    Les audios déjà générés pour le même texte sont repris du cache
+    (check_cache=False si l'appelant vient de faire fetch_cached_voice)
     """
-    import re
-    emoji_pattern = re.compile(
-        
-        "["
-        "\U0001F600-\U0001F64F"  # emoticons
-        "\U0001F300-\U0001F5FF"  # symbols & pictographs
-        "\U0001F680-\U0001F6FF"  # transport & map
-        "\U0001F700-\U0001F77F"
-        "*"
-        "\U0001F780-\U0001F7FF"
-        "\U0001F800-\U0001F8FF"
-        "\U0001F900-\U0001F9FF"
-        "\U0001FA00-\U0001FAFF"
-        "\U00002702-\U000027B0"
-        "]+",
-        flags=re.UNICODE
-    )
-
-    def remove_emojis(text):
-        return emoji_pattern.sub('', text)
     clean_text = remove_emojis(text).strip()
     if not clean_text:
         raise ValueError("Texte vide après suppression des emojis")
 
+    if check_cache and fetch_cached_voice(clean_text, output_path):
+        return True
+    discard_output(output_path)
+
     print(f"🔊 Génération audio pour: {text[:50]}...")
     
     # Essayer gTTS d'abord (meilleure qualité)
     try:
         if len(text.strip()) < 5:
             raise ValueError("Le texte est trop court pour la conversion.")
-        tts = gTTS(text=clean_text, lang='fr', slow=False)
-        tts.save(output_path)
+        chunks = sentence_chunks(clean_text)
+        if len(chunks) > 1:
+            # Longue réponse: une requête gTTS par groupe de phrases, en parallèle
+            gtts_parallel(chunks, output_path)
+        else:
+            tts = gTTS(text=clean_text, lang='fr', slow=False)
+            tts.save(output_path)
         print(f"✅ Audio généré avec gTTS: {output_path}")
+        audio_cache.store(audio_cache.key(clean_text, **_gtts_key(clean_text)), output_path)
         return True
     except Exception as e:
         print(f"⚠️ gTTS échoué, essai pyttsx3: {e}")
@@ -98,6 +187,7 @@ def text_to_voices(text, output_path, voice_id=None):
         engine.save_to_file(text=clean_text, output_path=output_path)
         engine.runAndWait()
         print(f"✅ Audio généré avec pyttsx3: {output_path}")
+        audio_cache.store(audio_cache.key(clean_text, **PYTTSX3_KEY), output_path)
         return True
         
     except Exception as e:
@@ -110,78 +200,41 @@ def list_voices():
     for voice in voices:
         print(f"{voice.id} - {voice.name}")
 ## Utilisation de TTS avec post-traitement audio
-def tts_to_voice(text, output_path):
+def tts_to_voice(text, output_path, voice=None):
+    """Synthèse Coqui avec une voix nommée (TTS_VOICES, femme2 par défaut) + post-traitement
+
+    Le post-traitement (EQ, reverb légère, passe-bas) se fait en mémoire sur
+    la sortie du modèle; output_path est écrit une seule fois, déjà traité.
+    """
     #youtube-dl https://youtube.com/shorts/jYosBW-zy5Q?si=tm0203WSWvw1Tk02 ffmpeg -i video.mp4 -ss 00:00:10 -t 10 -ar 22050 femme.wav
     #tts --model_name tts_models/fr/mai/tacotron2-DDC --text "Bonjour ! Je suis une voix féminine générée en français." --out_path francais_femme_ddc3.mp3
-    from TTS.api import TTS
-    import re
-    emoji_pattern = re.compile(
-        
-        "["
-        "\U0001F600-\U0001F64F"  # emoticons
-        "\U0001F300-\U0001F5FF"  # symbols & pictographs
-        "\U0001F680-\U0001F6FF"  # transport & map
-        "\U0001F700-\U0001F77F"
-        "*"
-        "\U0001F780-\U0001F7FF"
-        "\U0001F800-\U0001F8FF"
-        "\U0001F900-\U0001F9FF"
-        "\U0001FA00-\U0001FAFF"
-        "\U00002702-\U000027B0"
-        "]+",
-        flags=re.UNICODE
-    )
-
-    def remove_emojis(text):
-        return emoji_pattern.sub('', text)
     clean_text = remove_emojis(text).strip()
     if not clean_text:
         raise ValueError("Texte vide après suppression des emojis")
 
+    # Audio déjà généré pour ce texte, cette voix et ce post-traitement
+    chunks = sentence_chunks(clean_text)
+    params = {"model": coqui_pool.model_name, "post": post_processor.params}
+    if len(chunks) > 1:
+        params.update(chunk_chars=TTS_CHUNK_CHARS, crossfade_ms=TTS_CROSSFADE_MS)
+    ext = os.path.splitext(output_path)[1].lstrip(".").lower() or "wav"
+    key = audio_cache.key(clean_text, "coqui", speaker_cache.voice_id(voice), coqui_pool.language, params, ext=ext)
+    if audio_cache.fetch(key, output_path):
+        return
+    discard_output(output_path)
+
     print(f"🔊 Génération audio pour: {text[:50]}...")
 
-    tts = TTS("tts_models/multilingual/multi-dataset/your_tts")#tts_models/multilingual/multi-dataset/xtts_v2
-    tts.tts_to_file(
-        text=clean_text,
-        speaker_wav="femme2.wav",
-        language="fr-fr",
-        file_path=output_path
-    )
-    
+    # Modèle chargé une seule fois (COQUI_MODEL=your_tts ou xtts_v2, COQUI_INSTANCES),
+    # embedding de la voix calculé une seule fois. Longue réponse: phrases
+    # synthétisées en parallèle (autant que d'instances), remises dans l'ordre
+    results = synthesize_in_order(lambda chunk: coqui_pool.synthesize(chunk, voice), chunks)
+    sample_rate = results[0][1]
+    wav = crossfade_concat([samples for samples, _ in results], sample_rate, TTS_CROSSFADE_MS)
 
-    # === Charger le fichier TTS ===
-    audio_path = output_path
-    y, sr = librosa.load(audio_path, sr=22050)  # charge en mono
-
-    # === EQ simple: boost des médiums pour plus de clarté ===
-    def eq_boost(y, sr):
-        # filtre passe-bande 300-3000 Hz
-        import scipy.signal
-        sos = scipy.signal.butter(4, [300, 3000], btype='band', fs=sr, output='sos')
-        y_eq = scipy.signal.sosfilt(sos, y)
-        return y_eq
-
-    y_eq = eq_boost(y, sr)
-
-    # === Reverb légère ===
-    def add_reverb(y, sr, reverb_factor=0.2):
-        # convolution simple avec un petit IR simulé
-        ir = np.zeros(int(0.03*sr))  # 30ms reverb
-        ir[0] = 0.6
-        ir[int(0.01*sr)] = reverb_factor
-        y_rev = np.convolve(y, ir)[:len(y)]
-        return y_rev
-
-    y_rev = add_reverb(y_eq, sr)
-
-    # === Réduction de bruit basique ===
-    # simple filtrage passe-bas 8kHz pour réduire sifflements
-    sos = scipy.signal.butter(4, 8000, btype='low', fs=sr, output='sos')
-    y_clean = scipy.signal.sosfilt(sos, y_rev)
-
-    # === Sauvegarder le résultat ===
-    sf.write(f"{output_path}_post", y_clean, sr)
-    #print("✅ Post-traitement terminé, fichier sauvegardé !")
+    # === EQ 300-3000 Hz + passe-bas 8 kHz + reverb, puis sauvegarde ===
+    post_processor.write(output_path, wav, sample_rate)
+    audio_cache.store(key, output_path)
 
 
 # if __name__ == "__main__":